@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Habit, HabitCompletion
+from .models import Habit, HabitCompletion, HabitStats
 
 
 @admin.register(Habit)
@@ -8,7 +8,7 @@ class HabitAdmin(admin.ModelAdmin):
                     'is_pleasant', 'is_public', 'periodicity')
     list_filter = ('is_pleasant', 'is_public', 'periodicity', 'user')
     search_fields = ('action', 'place', 'user__username')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('next_fire_at', 'created_at', 'updated_at')
     fieldsets = (
         ('Основная информация', {
             'fields': ('user', 'action', 'place', 'time')
@@ -21,7 +21,7 @@ class HabitAdmin(admin.ModelAdmin):
             'fields': ('is_public',)
         }),
         ('Даты', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('next_fire_at', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
@@ -32,3 +32,12 @@ class HabitCompletionAdmin(admin.ModelAdmin):
     list_display = ('habit', 'completed_at', 'is_completed')
     list_filter = ('is_completed', 'completed_at')
     readonly_fields = ('completed_at',)
+
+
+@admin.register(HabitStats)
+class HabitStatsAdmin(admin.ModelAdmin):
+    list_display = ('habit', 'current_streak', 'longest_streak',
+                    'total_completions', 'last_completed_on')
+    readonly_fields = ('current_streak', 'longest_streak',
+                       'total_completions', 'last_completed_on',
+                       'day_counts', 'updated_at')
@@ -0,0 +1,251 @@
+import uuid
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from .feed import PUBLIC_HABIT_FIELDS, bump_public_feed_version
+from .models import Habit, HabitCompletion
+from .serializers import CompletionSyncSerializer, HabitSerializer
+from .stats import record_completions, without_stats
+
+BULK_BATCH_SIZE = 500
+
+
+def as_ids(values):
+    ids = set()
+    for value in values:
+        if isinstance(value, bool):
+            continue
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+
+def related_habits(items):
+    """Все связанные привычки элементов одним запросом"""
+    return Habit.objects.in_bulk(as_ids(
+        item.get('related_habit') for item in items if isinstance(item, dict)
+    ))
+
+
+def validate_habits(items, instances, context):
+    """Проверить элементы так же, как одиночные запросы.
+
+    Возвращает привычки с применёнными изменениями и список ошибок по
+    элементам (пустой словарь у корректных) или None, если ошибок нет.
+    """
+    context = {**context, 'related_habits': related_habits(items)}
+    user = context['request'].user
+    habits, errors = [], []
+
+    for item, instance in zip(items, instances):
+        serializer = HabitSerializer(
+            instance, data=item, partial=instance is not None,
+            context=context
+        )
+        if not serializer.is_valid():
+            errors.append(serializer.errors)
+            continue
+
+        habit = instance or Habit(user=user)
+        for attr, value in serializer.validated_data.items():
+            setattr(habit, attr, value)
+        try:
+            habit.clean_loaded()
+        except DjangoValidationError as e:
+            errors.append(serializers.as_serializer_error(e))
+            continue
+
+        habits.append(habit)
+        errors.append({})
+
+    if any(errors):
+        return habits, errors
+    return habits, None
+
+
+def bulk_create_habits(items, context):
+    habits, errors = validate_habits(items, [None] * len(items), context)
+    if errors:
+        return None, errors
+
+    now = timezone.now()
+    for habit in habits:
+        habit.schedule_on_save(now)
+
+    # bulk_create не вызывает сигналы: кеш ленты сбрасываем сами
+    with transaction.atomic():
+        habits = without_stats(Habit.objects.bulk_create(
+            habits, batch_size=BULK_BATCH_SIZE
+        ))
+        if any(habit.is_public for habit in habits):
+            transaction.on_commit(bump_public_feed_version)
+    return habits, None
+
+
+def find_user_habits(user, ids, related=()):
+    """Привычки пользователя по списку id и ошибки для ненайденных"""
+    found = (
+        Habit.objects
+        .filter(user=user)
+        .select_related('user', *related)
+        .in_bulk(as_ids(ids))
+    )
+    habits, errors, seen = [], [], set()
+    for value in ids:
+        try:
+            habit = found.get(int(value))
+        except (TypeError, ValueError):
+            habit = None
+
+        if habit is None:
+            errors.append({'id': ['Привычка не найдена.']})
+        elif habit.pk in seen:
+            errors.append({'id': ['Привычка указана повторно.']})
+        else:
+            errors.append({})
+        seen.add(getattr(habit, 'pk', None))
+        habits.append(habit)
+
+    if any(errors):
+        return habits, errors
+    return habits, None
+
+
+def bulk_update_habits(items, context):
+    ids = [item.get('id') if isinstance(item, dict) else None
+           for item in items]
+    instances, errors = find_user_habits(context['request'].user, ids,
+                                         related=['related_habit', 'stats'])
+    if errors:
+        return None, errors
+
+    was_public = any(habit.is_public for habit in instances)
+    habits, errors = validate_habits(items, instances, context)
+    if errors:
+        return None, errors
+
+    writable = {
+        name for name, field in HabitSerializer().fields.items()
+        if not field.read_only
+    }
+    fields = {'next_fire_at', 'updated_at'}
+    for item in items:
+        fields |= writable & set(item)
+
+    now = timezone.now()
+    for habit in habits:
+        habit.schedule_on_save(now)
+        habit.updated_at = now
+
+    # bulk_update не вызывает сигналы и не обновляет updated_at сам
+    with transaction.atomic():
+        Habit.objects.bulk_update(habits, fields, batch_size=BULK_BATCH_SIZE)
+        is_public = any(habit.is_public for habit in habits)
+        if (was_public or is_public) and fields & PUBLIC_HABIT_FIELDS:
+            transaction.on_commit(bump_public_feed_version)
+    for habit in habits:
+        habit._was_public = habit.is_public
+    return habits, None
+
+
+def bulk_delete_habits(user, ids):
+    habits, errors = find_user_habits(user, ids)
+    if errors:
+        return errors
+
+    # Удаление отправляет сигналы post_delete: кеши сбросят они
+    with transaction.atomic():
+        Habit.objects.filter(pk__in=[habit.pk for habit in habits]).delete()
+    return None
+
+
+def existing_completions(habit_ids, client_ids):
+    """Уже записанные пары (habit_id, client_id)"""
+    return set(
+        HabitCompletion.objects
+        .filter(habit_id__in=habit_ids, client_id__in=client_ids)
+        .values_list('habit_id', 'client_id')
+    )
+
+
+def bulk_create_completions(user, items):
+    """Записать выполнения, накопленные клиентом без сети.
+
+    Повтор элемента с тем же client_id (и в пределах пакета, и при
+    повторной отправке) не создаёт строку. Возвращает результат по каждому
+    элементу: created, duplicate или error с описанием ошибок.
+    """
+    results, valid = [], {}
+    for index, item in enumerate(items):
+        serializer = CompletionSyncSerializer(data=item)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+            results.append(None)
+        else:
+            results.append({'status': 'error', 'errors': serializer.errors})
+
+    owned = set(
+        Habit.objects
+        .filter(user=user, pk__in={data['habit'] for data in valid.values()})
+        .values_list('pk', flat=True)
+    )
+    existing = existing_completions(
+        owned, {data['client_id'] for data in valid.values()}
+    )
+
+    now = timezone.now()
+    token = uuid.uuid4()
+    completions, created = [], {}
+    for index, data in valid.items():
+        key = (data['habit'], data['client_id'])
+        if data['habit'] not in owned:
+            results[index] = {'status': 'error', 'errors': {
+                'habit': ['Привычка не найдена.']
+            }}
+        elif key in existing:
+            results[index] = {'status': 'duplicate'}
+        else:
+            existing.add(key)
+            completions.append(HabitCompletion(
+                habit_id=data['habit'],
+                client_id=data['client_id'],
+                completed_at=data.get('completed_at', now),
+                is_completed=data['is_completed'],
+                ingest_token=token
+            ))
+            created[key] = index
+
+    if completions:
+        with transaction.atomic():
+            HabitCompletion.objects.bulk_create(
+                completions, batch_size=BULK_BATCH_SIZE,
+                ignore_conflicts=True
+            )
+            # Параллельная отправка того же пакета могла вставить часть
+            # строк раньше: такие строки пропущены, а в статистике их
+            # учтёт вставивший запрос
+            inserted = set(
+                HabitCompletion.objects
+                .filter(habit_id__in={key[0] for key in created},
+                        client_id__in={key[1] for key in created},
+                        ingest_token=token)
+                .values_list('habit_id', 'client_id')
+            )
+            record_completions([
+                completion for completion in completions
+                if (completion.habit_id, completion.client_id) in inserted
+            ])
+
+        for key, index in created.items():
+            results[index] = {
+                'status': 'created' if key in inserted else 'duplicate'
+            }
+
+    for index, result in enumerate(results):
+        item = items[index]
+        if isinstance(item, dict) and 'client_id' in item:
+            result['client_id'] = item['client_id']
+    return results
@@ -0,0 +1,55 @@
+import hashlib
+import time
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+USER_CHANGED_KEY = 'habits:user:{}:changed_at'
+
+
+def touch_user_habits(user_id):
+    """Отметить изменение привычек пользователя (в т.ч. удаление)"""
+    cache.set(USER_CHANGED_KEY.format(user_id), time.time(), None)
+
+
+def user_habits_changed_at(user_id):
+    return cache.get(USER_CHANGED_KEY.format(user_id), 0)
+
+
+def make_etag(*parts):
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+    return quote_etag(digest)
+
+
+def list_validators(request, queryset, changed_at=0, seed=()):
+    """ETag и Last-Modified списка одним агрегирующим запросом.
+
+    Число записей замечает удаления, max(updated_at) — изменения и
+    добавления; список при этом не сериализуется.
+    """
+    stats = queryset.order_by().aggregate(
+        count=Count('id'), updated_at=Max('updated_at')
+    )
+    updated_at = stats['updated_at'].timestamp() if stats['updated_at'] else 0
+    last_modified = int(max(updated_at, changed_at)) or None
+    etag = make_etag(request.build_absolute_uri(), stats['count'],
+                     updated_at, changed_at, seed)
+    return etag, last_modified
+
+
+def not_modified(request, etag, last_modified):
+    """Ответ 304, если у клиента актуальная версия, иначе None"""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    return response
@@ -0,0 +1,103 @@
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import Habit, HabitCompletion
+
+HABIT_COLUMNS = ['id', 'place', 'time', 'action', 'is_pleasant',
+                 'related_habit', 'periodicity', 'day_of_week', 'reward',
+                 'execution_time', 'is_public', 'created_at', 'updated_at']
+COMPLETION_COLUMNS = ['id', 'habit', 'completed_at', 'is_completed',
+                      'client_id']
+
+# Строки CSV: тип записи и объединение столбцов привычек и выполнений
+CSV_COLUMNS = ['record'] + HABIT_COLUMNS + [
+    column for column in COMPLETION_COLUMNS if column not in HABIT_COLUMNS
+]
+
+# Строк, читаемых из базы за раз, и размер отдаваемых кусков
+EXPORT_CHUNK_ROWS = 2000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+encoder = DjangoJSONEncoder(ensure_ascii=False)
+
+
+def export_records(user):
+    """Привычки пользователя, за каждой — её выполнения по времени.
+
+    Обе выборки читаются итераторами кусками по EXPORT_CHUNK_ROWS строк
+    и сливаются по id привычки, поэтому память не зависит от объёма.
+    """
+    habits = (
+        Habit.objects
+        .filter(user=user)
+        .order_by('pk')
+        .values(*HABIT_COLUMNS)
+        .iterator(chunk_size=EXPORT_CHUNK_ROWS)
+    )
+    completions = (
+        HabitCompletion.objects
+        .filter(habit__user=user)
+        .order_by('habit_id', 'completed_at', 'pk')
+        .values(*COMPLETION_COLUMNS)
+        .iterator(chunk_size=EXPORT_CHUNK_ROWS)
+    )
+
+    completion = next(completions, None)
+    for habit in habits:
+        yield 'habit', habit
+        while completion is not None and completion['habit'] <= habit['id']:
+            if completion['habit'] == habit['id']:
+                yield 'completion', completion
+            completion = next(completions, None)
+
+
+def plain(value):
+    """Значение в том же виде, что и в JSON (даты ISO 8601, UUID)"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return encoder.default(value)
+
+
+def ndjson_lines(records):
+    for record, row in records:
+        yield encoder.encode({'record': record, **row}) + '\n'
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(records):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for record, row in records:
+        yield writer.writerow(
+            [record] + [plain(row.get(column)) for column in CSV_COLUMNS[1:]]
+        )
+
+
+def chunked(lines, size=EXPORT_CHUNK_BYTES):
+    """Склеить строки в куски до size символов; первая уходит сразу"""
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return
+    yield first
+
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', ndjson_lines),
+    'csv': ('text/csv; charset=utf-8', csv_lines),
+}
@@ -0,0 +1,139 @@
+from zoneinfo import ZoneInfo
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .models import completions_since, empty_day_counts, streak_on
+from .serializers import (
+    HabitSerializer,
+    HabitStatsSerializer,
+    PublicHabitSerializer,
+)
+
+
+class RowSerializer:
+    """Сериализация строк values() для списков без ModelSerializer.
+
+    Столбцы и преобразования берутся из полей сериализатора DRF: каждое
+    значение проходит через to_representation того же поля, поэтому ответ
+    совпадает с ответом сериализатора байт в байт. Вложенные сериализаторы
+    читаются из столбцов связанной модели (user__username), а для
+    SerializerMethodField передаются свои столбцы и функции.
+    """
+
+    def __init__(self, serializer, method_fields=None):
+        self.method_fields = method_fields or {}
+        self.columns = []
+        self.plan = self.build(serializer, prefix='')
+
+    def build(self, serializer, prefix):
+        plan = []
+        for name, field in serializer.fields.items():
+            if isinstance(field, serializers.SerializerMethodField):
+                columns, method = self.method_fields[name]
+                self.columns += columns
+                plan.append((name, None, method))
+            elif isinstance(field, serializers.BaseSerializer):
+                nested = self.build(field, f'{prefix}{field.source}__')
+                plan.append((name, None, nested))
+            elif isinstance(field, serializers.RelatedField):
+                # Как PrimaryKeyRelatedField: наружу уходит id
+                self.columns.append(prefix + field.source)
+                plan.append((name, prefix + field.source, None))
+            elif isinstance(field, serializers.DateTimeField):
+                # Часовой пояс и формат определяются один раз на список
+                self.columns.append(prefix + field.source)
+                plan.append((name, prefix + field.source, field))
+            else:
+                self.columns.append(prefix + field.source)
+                plan.append((name, prefix + field.source,
+                             field.to_representation))
+        return plan
+
+    def resolve(self, plan):
+        """План с преобразованиями дат для текущего часового пояса"""
+        resolved = []
+        for name, column, convert in plan:
+            if isinstance(convert, list):
+                convert = self.resolve(convert)
+            elif isinstance(convert, serializers.DateTimeField):
+                convert = datetime_converter(convert)
+            resolved.append((name, column, convert))
+        return resolved
+
+    def values(self, queryset):
+        return queryset.values(*dict.fromkeys(self.columns))
+
+    def represent(self, row, plan):
+        data = {}
+        for name, column, convert in plan:
+            if column is None:
+                if callable(convert):
+                    data[name] = convert(row)
+                else:
+                    data[name] = self.represent(row, convert)
+                continue
+            value = row[column]
+            if value is not None and convert is not None:
+                value = convert(value)
+            data[name] = value
+        return data
+
+    def to_representation(self, rows):
+        plan = self.resolve(self.plan)
+        return [self.represent(row, plan) for row in rows]
+
+
+def datetime_converter(field):
+    """DateTimeField.to_representation для списка значений.
+
+    DRF на каждое значение ищет текущий часовой пояс и настройки формата;
+    здесь они определяются один раз. Для наивных значений и формата,
+    отличного от ISO 8601, используется само поле.
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+    tz = (field.timezone if hasattr(field, 'timezone')
+          else field.default_timezone())
+    if tz is None:
+        return field.to_representation
+
+    def convert(value):
+        if timezone.is_naive(value):
+            return field.to_representation(value)
+        value = value.astimezone(tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+last_completed_on_field = HabitStatsSerializer().fields['last_completed_on']
+
+
+def habit_stats(row):
+    """Поле stats HabitSerializer по столбцам строки"""
+    tz = row['user__timezone']
+    today = timezone.now().astimezone(ZoneInfo(tz)).date()
+    last = row['stats__last_completed_on']
+    counts = row['stats__day_counts'] or empty_day_counts()
+    return {
+        'current_streak': streak_on(row['stats__current_streak'] or 0, last,
+                                    today, row['periodicity']),
+        'longest_streak': row['stats__longest_streak'] or 0,
+        'total_completions': row['stats__total_completions'] or 0,
+        'last_completed_on': (
+            last and last_completed_on_field.to_representation(last)
+        ),
+        'completions_7d': completions_since(counts, last, 7, today),
+        'completions_30d': completions_since(counts, last, 30, today),
+    }
+
+
+habit_rows = RowSerializer(HabitSerializer(), method_fields={
+    'stats': (['periodicity', 'user__timezone', 'stats__current_streak',
+               'stats__longest_streak', 'stats__total_completions',
+               'stats__last_completed_on', 'stats__day_counts'],
+              habit_stats),
+})
+public_habit_rows = RowSerializer(PublicHabitSerializer())
@@ -0,0 +1,56 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+PUBLIC_FEED_VERSION_KEY = 'habits:public_feed:version'
+PUBLIC_FEED_CHANGED_KEY = 'habits:public_feed:changed_at'
+
+# Поля привычки и пользователя, которые видны в публичной ленте
+PUBLIC_HABIT_FIELDS = {
+    'is_public', 'user', 'place', 'time', 'action', 'periodicity',
+    'execution_time', 'created_at',
+}
+PUBLIC_USER_FIELDS = {'username', 'email', 'telegram_chat_id'}
+
+
+def public_feed_version():
+    version = cache.get(PUBLIC_FEED_VERSION_KEY)
+    if version is None:
+        cache.add(PUBLIC_FEED_VERSION_KEY, 1, None)
+        version = cache.get(PUBLIC_FEED_VERSION_KEY, 1)
+    return version
+
+
+def bump_public_feed_version():
+    """Сделать недействительными все закешированные страницы ленты"""
+    # Время изменения нужно для Last-Modified: привычка, ставшая личной
+    # или удалённая, не меняет max(updated_at) ленты
+    cache.set(PUBLIC_FEED_CHANGED_KEY, time.time(), None)
+    cache.add(PUBLIC_FEED_VERSION_KEY, 1, None)
+    try:
+        cache.incr(PUBLIC_FEED_VERSION_KEY)
+    except ValueError:
+        cache.set(PUBLIC_FEED_VERSION_KEY, 1, None)
+
+
+def public_feed_changed_at():
+    return cache.get(PUBLIC_FEED_CHANGED_KEY, 0)
+
+
+def public_feed_cache_key(request):
+    """Ключ страницы ленты: версия ленты и полный URL запроса.
+
+    URL включает хост, потому что ссылки next/previous абсолютные.
+    """
+    url = hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()
+    return f'habits:public_feed:{public_feed_version()}:{url}'
+
+
+def get_cached_public_feed(request):
+    return cache.get(public_feed_cache_key(request))
+
+
+def cache_public_feed(request, entry):
+    cache.set(public_feed_cache_key(request), entry,
+              settings.PUBLIC_FEED_CACHE_TIMEOUT)
@@ -0,0 +1,97 @@
+from datetime import datetime, time, timedelta
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+from .models import HabitCompletion
+
+PERIODS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# Закрытые периоды кешируются, пока выполнение задним числом или
+# удаление привычки не сменит версию истории пользователя
+HISTORY_VERSION_KEY = 'habits:history:{}:version'
+HISTORY_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Самый длинный запрашиваемый интервал и интервал по умолчанию, в днях
+HISTORY_MAX_DAYS = 3 * 366
+HISTORY_DEFAULT_DAYS = 365
+
+
+def history_version(user_id):
+    key = HISTORY_VERSION_KEY.format(user_id)
+    cache.add(key, 1, None)
+    return cache.get(key, 1)
+
+
+def bump_history_version(user_id):
+    key = HISTORY_VERSION_KEY.format(user_id)
+    cache.add(key, 1, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def bucket_start(day, period):
+    if period == 'week':
+        return day - timedelta(day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_counts(habit_ids, period, tz, start, end):
+    """Число выполнений по периодам с start по end (даты в tz).
+
+    Группирует база: по индексу (habit, completed_at) читаются только
+    выполнения периода, а наружу уходит по строке на непустой период.
+    """
+    if start > end:
+        return []
+    trunc = PERIODS[period]
+    rows = (
+        HabitCompletion.objects
+        .filter(
+            habit_id__in=habit_ids,
+            is_completed=True,
+            completed_at__gte=datetime.combine(start, time.min, tzinfo=tz),
+            completed_at__lt=datetime.combine(end + timedelta(1), time.min,
+                                              tzinfo=tz),
+        )
+        .annotate(bucket=trunc('completed_at', tzinfo=tz))
+        .order_by()
+        .values('bucket')
+        .annotate(count=Count('id'))
+        .order_by('bucket')
+    )
+    return [
+        {'date': row['bucket'].astimezone(tz).date().isoformat(),
+         'count': row['count']}
+        for row in rows
+    ]
+
+
+def completion_history(user, habit_ids, period, start, end, scope):
+    """Выполнения привычек пользователя по дням, неделям или месяцам.
+
+    Периоды до текущего (закрытые) берутся из кеша; scope отличает
+    историю одной привычки от истории всех привычек в ключе кеша.
+    """
+    tz = user.tzinfo
+    start = bucket_start(start, period)
+    current = bucket_start(timezone.now().astimezone(tz).date(), period)
+
+    closed_end = min(end, current - timedelta(1))
+    key = (f'habits:history:{user.pk}:{history_version(user.pk)}:'
+           f'{scope}:{period}:{user.timezone}:{start}:{closed_end}')
+    closed = cache.get(key) if start <= closed_end else []
+    if closed is None:
+        closed = bucket_counts(habit_ids, period, tz, start, closed_end)
+        cache.set(key, closed, HISTORY_CACHE_TIMEOUT)
+
+    return closed + bucket_counts(habit_ids, period, tz,
+                                  max(start, current), end)
@@ -0,0 +1,130 @@
+import time
+import uuid
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from apps.habits.fast import habit_rows, public_habit_rows
+from apps.habits.models import Habit, HabitStats
+from apps.habits.serializers import HabitSerializer, PublicHabitSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнение сериализации списков привычек: ModelSerializer '
+            'и строки values() (fast.py)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--habits', type=int, default=5000,
+                            help='Сколько привычек создать')
+        parser.add_argument('--users', type=int, default=500,
+                            help='Сколько пользователей создать')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Повторов каждого замера (берётся лучший)')
+        parser.add_argument('--keep', action='store_true',
+                            help='Не удалять созданные данные')
+
+    def handle(self, *args, **options):
+        prefix = f'bench_{uuid.uuid4().hex[:8]}'
+        try:
+            self.stdout.write('Создание данных...')
+            self.seed(prefix, options)
+            habits = (
+                Habit.objects
+                .filter(user__username__startswith=prefix)
+                .select_related('user', 'stats')
+                .order_by('-created_at', '-id')
+            )
+            public = habits.filter(is_public=True)
+
+            results = [
+                ('Привычки пользователя', habits, HabitSerializer,
+                 habit_rows),
+                ('Публичная лента', public, PublicHabitSerializer,
+                 public_habit_rows),
+            ]
+            self.stdout.write(self.style.SUCCESS('Результаты:'))
+            for title, queryset, serializer_class, rows in results:
+                self.compare(title, queryset, serializer_class, rows,
+                             options['repeat'])
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=prefix).delete()
+
+    def compare(self, title, queryset, serializer_class, rows, repeat):
+        count = queryset.count()
+
+        def drf():
+            return serializer_class(list(queryset), many=True).data
+
+        def fast():
+            return rows.to_representation(list(rows.values(queryset)))
+
+        drf_time, drf_data = self.best_of(drf, repeat)
+        fast_time, fast_data = self.best_of(fast, repeat)
+        renderer = JSONRenderer()
+        identical = renderer.render(drf_data) == renderer.render(fast_data)
+
+        self.stdout.write(f'  {title} ({count} строк):')
+        self.stdout.write(f'    ModelSerializer: {drf_time:.3f} с, '
+                          f'{drf_time / count * 1e6:.1f} мкс на строку')
+        self.stdout.write(f'    values():        {fast_time:.3f} с, '
+                          f'{fast_time / count * 1e6:.1f} мкс на строку')
+        self.stdout.write(f'    Ускорение: {drf_time / fast_time:.1f}x, '
+                          f'ответы совпадают: {"да" if identical else "НЕТ"}')
+
+    def best_of(self, func, repeat):
+        best, data = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, data
+
+    def seed(self, prefix, options):
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=f'{prefix}_{i}',
+                    email=f'{prefix}_{i}@example.com',
+                    telegram_chat_id=str(10 ** 9 + i),
+                    password='!'
+                )
+                for i in range(options['users'])
+            ],
+            batch_size=1000
+        )
+        if not users[0].pk:
+            # Бэкенд не вернул первичные ключи из bulk_create
+            users = list(User.objects.filter(username__startswith=prefix))
+
+        now = timezone.now()
+        habits = Habit.objects.bulk_create(
+            [
+                Habit(
+                    user=users[i % len(users)],
+                    place='Дома',
+                    time=now.time(),
+                    action=f'Привычка {i}',
+                    execution_time=60,
+                    is_public=i % 2 == 0,
+                    next_fire_at=now
+                )
+                for i in range(options['habits'])
+            ],
+            batch_size=1000
+        )
+        if not habits[0].pk:
+            habits = list(Habit.objects.filter(
+                user__username__startswith=prefix
+            ))
+
+        today = now.date()
+        stats = []
+        for habit in habits[::2]:
+            item = HabitStats(habit=habit)
+            item.record(today, habit.periodicity)
+            stats.append(item)
+        HabitStats.objects.bulk_create(stats, batch_size=1000)
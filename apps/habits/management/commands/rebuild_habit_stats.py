@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from apps.habits.models import Habit
+from apps.habits.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитать статистику привычек по истории выполнений '
+            '(первичное заполнение и исправление расхождений)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--habit', type=int, action='append',
+                            help='id привычки; можно указать несколько раз')
+        parser.add_argument('--user', type=int,
+                            help='Только привычки пользователя с этим id')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Привычек, пересчитываемых за один раз')
+
+    def handle(self, *args, **options):
+        habits = Habit.objects.select_related('user').order_by('pk')
+        if options['habit']:
+            habits = habits.filter(pk__in=options['habit'])
+        if options['user']:
+            habits = habits.filter(user_id=options['user'])
+
+        # Курсор по id: память не растёт с числом привычек
+        rebuilt, last_pk = 0, 0
+        while True:
+            chunk = list(habits.filter(pk__gt=last_pk)[:options['chunk_size']])
+            if not chunk:
+                break
+            rebuild_stats(chunk)
+            rebuilt += len(chunk)
+            last_pk = chunk[-1].pk
+
+        self.stdout.write(f'Пересчитана статистика привычек: {rebuilt}')
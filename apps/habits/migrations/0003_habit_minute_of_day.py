@@ -0,0 +1,32 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_minute_of_day(apps, schema_editor):
+    Habit = apps.get_model('habits', 'Habit')
+    habits = list(Habit.objects.only('id', 'time'))
+    for habit in habits:
+        habit.minute_of_day = habit.time.hour * 60 + habit.time.minute
+    Habit.objects.bulk_update(habits, ['minute_of_day'], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0002_alter_habit_action_alter_habit_execution_time_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='minute_of_day',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Вычисляется из времени выполнения для планировщика', verbose_name='Минута суток'),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['minute_of_day', 'periodicity', 'day_of_week'], name='habit_schedule_idx'),
+        ),
+        migrations.RunPython(fill_minute_of_day, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:09
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def next_occurrence(habit_time, periodicity, day_of_week, tz, after):
+    """Копия habits.models.next_occurrence на момент миграции"""
+    habit_time = habit_time.replace(second=0, microsecond=0)
+    day = after.astimezone(tz).date()
+
+    for _ in range(8):
+        if periodicity != 'weekly' or day.isoweekday() == day_of_week:
+            candidate = datetime.combine(day, habit_time, tzinfo=tz)
+            candidate = candidate.astimezone(dt_timezone.utc)
+            if candidate > after:
+                return candidate
+        day += timedelta(days=1)
+
+    return None
+
+
+def fill_next_fire_at(apps, schema_editor):
+    Habit = apps.get_model('habits', 'Habit')
+    now = timezone.now()
+    habits = list(Habit.objects.select_related('user'))
+    for habit in habits:
+        habit.next_fire_at = next_occurrence(
+            habit.time, habit.periodicity, habit.day_of_week,
+            ZoneInfo(habit.user.timezone), now
+        )
+    Habit.objects.bulk_update(habits, ['next_fire_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0003_habit_minute_of_day'),
+        ('users', '0002_user_timezone'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='habit',
+            name='habit_schedule_idx',
+        ),
+        migrations.RemoveField(
+            model_name='habit',
+            name='minute_of_day',
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='next_fire_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='Вычисляется с учётом часового пояса пользователя', null=True, verbose_name='Следующее напоминание'),
+        ),
+        migrations.RunPython(fill_next_fire_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0005_habit_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habitcompletion',
+            name='client_id',
+            field=models.UUIDField(blank=True, help_text='Генерируется клиентом: повтор запроса не создаёт второе выполнение', null=True, verbose_name='Ключ идемпотентности'),
+        ),
+        migrations.AlterField(
+            model_name='habitcompletion',
+            name='completed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddConstraint(
+            model_name='habitcompletion',
+            constraint=models.UniqueConstraint(fields=('habit', 'client_id'), name='habit_completion_client_id_uniq'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:02
+
+import apps.habits.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0006_habitcompletion_client_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HabitStats',
+            fields=[
+                ('habit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='habits.habit', verbose_name='Привычка')),
+                ('current_streak', models.PositiveIntegerField(default=0, help_text='Периодов подряд с выполнением до last_completed_on', verbose_name='Текущая серия')),
+                ('longest_streak', models.PositiveIntegerField(default=0, verbose_name='Лучшая серия')),
+                ('total_completions', models.PositiveIntegerField(default=0, verbose_name='Всего выполнений')),
+                ('last_completed_on', models.DateField(blank=True, help_text='Дата в часовом поясе пользователя', null=True, verbose_name='Последнее выполнение')),
+                ('day_counts', models.JSONField(default=apps.habits.models.empty_day_counts, verbose_name='Выполнения по дням')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Статистика привычки',
+                'verbose_name_plural': 'Статистика привычек',
+            },
+        ),
+    ]
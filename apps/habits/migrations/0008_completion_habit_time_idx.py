@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0007_habitstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='habitcompletion',
+            index=models.Index(fields=['habit', 'completed_at'], name='completion_habit_time_idx'),
+        ),
+    ]
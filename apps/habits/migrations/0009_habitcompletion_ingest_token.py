@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0008_completion_habit_time_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habitcompletion',
+            name='ingest_token',
+            field=models.UUIDField(blank=True, editable=False, help_text='Отличает строки, вставленные запросом, от строк параллельной отправки того же пакета', null=True, verbose_name='Запрос загрузки'),
+        ),
+    ]
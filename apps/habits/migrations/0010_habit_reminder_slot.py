@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:05
+
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0009_habitcompletion_ingest_token'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='reminder_slot',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('user_id'), '%%', models.Value(1024)), help_text='Шард проверки берёт привычки своих слотов по индексу', output_field=models.PositiveSmallIntegerField(), verbose_name='Слот проверки напоминаний'),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['reminder_slot', 'next_fire_at'], name='habit_slot_fire_idx'),
+        ),
+    ]
@@ -1,10 +1,79 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.db import models
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 User = get_user_model()
 
 
+# Глубина кольцевого буфера выполнений по дням в HabitStats
+STATS_WINDOW_DAYS = 30
+
+
+def habit_period(day, periodicity):
+    """Номер периода привычки (дня или недели с понедельника) для серий"""
+    if periodicity == 'weekly':
+        # date(1, 1, 1) — понедельник
+        return (day.toordinal() - 1) // 7
+    return day.toordinal()
+
+
+def empty_day_counts():
+    return [0] * STATS_WINDOW_DAYS
+
+
+def completions_since(day_counts, last_completed_on, days, today):
+    """Выполнения за последние days дней по кольцевому буферу HabitStats"""
+    if last_completed_on is None:
+        return 0
+    oldest = max(today - timedelta(days - 1),
+                 last_completed_on - timedelta(STATS_WINDOW_DAYS - 1))
+    total = 0
+    day = min(today, last_completed_on)
+    while day >= oldest:
+        total += day_counts[day.toordinal() % STATS_WINDOW_DAYS]
+        day -= timedelta(1)
+    return total
+
+
+def streak_on(current_streak, last_completed_on, today, periodicity):
+    """Серия HabitStats, если она не прервана к дню today"""
+    if last_completed_on is None:
+        return 0
+    missed = (habit_period(today, periodicity) -
+              habit_period(last_completed_on, periodicity))
+    return current_streak if missed <= 1 else 0
+
+
+# Привычки делятся на постоянные слоты по пользователю; шард проверки
+# напоминаний берёт слоты slot % REMINDER_SHARD_COUNT == shard, поэтому
+# число шардов можно менять без пересчёта строк
+REMINDER_SLOTS = 1024
+
+
+def next_occurrence(habit_time, periodicity, day_of_week, tz, after):
+    """Ближайшее после after срабатывание привычки (в UTC).
+
+    Время привычки задаётся в часовом поясе пользователя tz, поэтому
+    переходы на летнее время учитываются автоматически: несуществующее
+    локальное время сдвигается вперёд, неоднозначное берётся первым.
+    """
+    habit_time = habit_time.replace(second=0, microsecond=0)
+    day = after.astimezone(tz).date()
+
+    for _ in range(8):
+        if periodicity != 'weekly' or day.isoweekday() == day_of_week:
+            candidate = datetime.combine(day, habit_time, tzinfo=tz)
+            candidate = candidate.astimezone(dt_timezone.utc)
+            if candidate > after:
+                return candidate
+        day += timedelta(days=1)
+
+    return None
+
+
 class Habit(models.Model):
     PERIOD_CHOICES = [
         ('daily', 'Ежедневно'),
@@ -79,6 +148,21 @@ class Habit(models.Model):
         default=False,
         verbose_name='Признак публичности'
     )
+    next_fire_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+        verbose_name='Следующее напоминание',
+        help_text='Вычисляется с учётом часового пояса пользователя'
+    )
+    reminder_slot = models.GeneratedField(
+        expression=models.F('user_id') % REMINDER_SLOTS,
+        output_field=models.PositiveSmallIntegerField(),
+        db_persist=True,
+        verbose_name='Слот проверки напоминаний',
+        help_text='Шард проверки берёт привычки своих слотов по индексу'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -118,8 +202,33 @@ class Habit(models.Model):
         if errors:
             raise ValidationError(errors)
 
+    def schedule_next_fire(self, after):
+        """Пересчитать время следующего напоминания после момента after"""
+        self.next_fire_at = next_occurrence(
+            self.time, self.periodicity, self.day_of_week,
+            self.user.tzinfo, after
+        )
+
+    def schedule_on_save(self, now):
+        # Напоминание, опоздавшее не более чем на grace-период, ещё
+        # отправится; повтор уже отправленного отсекает журнал отправок
+        grace = timedelta(minutes=settings.REMINDER_GRACE_MINUTES)
+        self.schedule_next_fire(now - grace)
+
+    def clean_loaded(self):
+        """full_clean() для массовых операций: пользователь и связанная
+        привычка уже загружены, их существование в базе не проверяется"""
+        self.clean_fields(exclude=['user', 'related_habit'])
+        self.clean()
+
     def save(self, *args, **kwargs):
         self.full_clean()
+        self.schedule_on_save(timezone.now())
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'next_fire_at'}
+
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -131,6 +240,24 @@ class Habit(models.Model):
         verbose_name = 'Привычка'
         verbose_name_plural = 'Привычки'
         ordering = ['-created_at']
+        indexes = [
+            # Ленты привычек пользователя и публичных привычек
+            # с навигацией по курсору (created_at, id)
+            models.Index(
+                fields=['user', '-created_at', '-id'],
+                name='habit_user_created_idx'
+            ),
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(is_public=True),
+                name='habit_public_created_idx'
+            ),
+            # Проверка напоминаний по шардам
+            models.Index(
+                fields=['reminder_slot', 'next_fire_at'],
+                name='habit_slot_fire_idx'
+            ),
+        ]
 
 
 class HabitCompletion(models.Model):
@@ -139,10 +266,132 @@ class HabitCompletion(models.Model):
         on_delete=models.CASCADE,
         related_name='completions'
     )
-    completed_at = models.DateTimeField(auto_now_add=True)
+    # Офлайн-клиенты передают время выполнения сами
+    completed_at = models.DateTimeField(default=timezone.now)
     is_completed = models.BooleanField(default=True)
+    client_id = models.UUIDField(
+        null=True,
+        blank=True,
+        verbose_name='Ключ идемпотентности',
+        help_text='Генерируется клиентом: повтор запроса не создаёт '
+                  'второе выполнение'
+    )
+    ingest_token = models.UUIDField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Запрос загрузки',
+        help_text='Отличает строки, вставленные запросом, от строк '
+                  'параллельной отправки того же пакета'
+    )
 
     class Meta:
         verbose_name = 'Выполнение привычки'
         verbose_name_plural = 'Выполнения привычек'
         ordering = ['-completed_at']
+        indexes = [
+            # История выполнений привычки за период (см. history.py)
+            models.Index(
+                fields=['habit', 'completed_at'],
+                name='completion_habit_time_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['habit', 'client_id'],
+                name='habit_completion_client_id_uniq'
+            ),
+        ]
+
+
+class HabitStats(models.Model):
+    """Статистика привычки, обновляемая при каждом выполнении.
+
+    Счётчики за 7 и 30 дней берутся из кольцевого буфера day_counts:
+    ячейка day.toordinal() % STATS_WINDOW_DAYS хранит выполнения за день,
+    актуальные для дней не раньше чем за STATS_WINDOW_DAYS до
+    last_completed_on.
+    """
+    habit = models.OneToOneField(
+        Habit,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Привычка'
+    )
+    current_streak = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Текущая серия',
+        help_text='Периодов подряд с выполнением до last_completed_on'
+    )
+    longest_streak = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Лучшая серия'
+    )
+    total_completions = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Всего выполнений'
+    )
+    last_completed_on = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name='Последнее выполнение',
+        help_text='Дата в часовом поясе пользователя'
+    )
+    day_counts = models.JSONField(
+        default=empty_day_counts,
+        verbose_name='Выполнения по дням'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def record(self, day, periodicity):
+        """Учесть выполнение в день day.
+
+        Возвращает False, если выполнение относится к периоду раньше
+        последнего: серии тогда нужно пересчитать по истории.
+        """
+        self.total_completions += 1
+        self.count_day(day)
+
+        last = self.last_completed_on
+        period = habit_period(day, periodicity)
+        if last is not None:
+            last_period = habit_period(last, periodicity)
+            if period < last_period:
+                return False
+            if period == last_period:
+                self.last_completed_on = max(last, day)
+                return True
+            if period > last_period + 1:
+                self.current_streak = 0
+
+        self.current_streak += 1
+        self.longest_streak = max(self.longest_streak, self.current_streak)
+        self.last_completed_on = day
+        return True
+
+    def count_day(self, day):
+        head = self.last_completed_on
+        if head is not None and day <= head - timedelta(STATS_WINDOW_DAYS):
+            return
+        if head is not None and day > head:
+            # Обнулить ячейки дней между прошлым выполнением и day
+            gap = min((day - head).days, STATS_WINDOW_DAYS)
+            for offset in range(gap):
+                cell = (day - timedelta(offset)).toordinal()
+                self.day_counts[cell % STATS_WINDOW_DAYS] = 0
+        self.day_counts[day.toordinal() % STATS_WINDOW_DAYS] += 1
+
+    def completions_since(self, days, today):
+        """Выполнения за последние days дней, включая today"""
+        return completions_since(self.day_counts, self.last_completed_on,
+                                 days, today)
+
+    def streak_on(self, today, periodicity):
+        """Серия, которая ещё не прервана к дню today"""
+        return streak_on(self.current_streak, self.last_completed_on,
+                         today, periodicity)
+
+    class Meta:
+        verbose_name = 'Статистика привычки'
+        verbose_name_plural = 'Статистика привычек'
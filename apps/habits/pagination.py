@@ -0,0 +1,52 @@
+from rest_framework.pagination import (
+    BasePagination,
+    CursorPagination,
+    PageNumberPagination,
+)
+
+
+class HabitCursorPagination(CursorPagination):
+    """Навигация по курсору (created_at, id): без COUNT и OFFSET,
+    поэтому любая страница ленты выбирается за одинаковое время"""
+    ordering = ('-created_at', '-id')
+
+
+class HabitPagination(BasePagination):
+    """Постраничная навигация по номеру страницы (по умолчанию, как
+    раньше) или по курсору — с ?pagination=cursor.
+
+    Ссылки next/previous в режиме курсора сохраняют параметр, поэтому
+    клиенту достаточно выбрать режим на первой странице.
+    """
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.page_number = PageNumberPagination()
+        self.cursor = HabitCursorPagination()
+        self.active = self.page_number
+
+    def use_cursor(self, request):
+        return (request.query_params.get(self.mode_query_param) == 'cursor'
+                or self.cursor.cursor_query_param in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.active = self.cursor
+        return self.active.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return (self.page_number.get_schema_operation_parameters(view) +
+                self.cursor.get_schema_operation_parameters(view))
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.active, 'display_page_controls', False)
+
+    def to_html(self):
+        return self.active.to_html()
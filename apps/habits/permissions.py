@@ -3,4 +3,5 @@ from rest_framework import permissions
 
 class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user
+        # Сравнение id не загружает пользователя привычки из базы
+        return obj.user_id == request.user.id
@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import Habit, HabitCompletion
+from datetime import timedelta
+from django.utils import timezone
+from .history import HISTORY_DEFAULT_DAYS, HISTORY_MAX_DAYS, PERIODS
+from .models import Habit, HabitCompletion, HabitStats
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -11,14 +14,66 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'email', 'telegram_chat_id')
 
 
+class HabitStatsSerializer(serializers.ModelSerializer):
+    current_streak = serializers.SerializerMethodField()
+    completions_7d = serializers.SerializerMethodField()
+    completions_30d = serializers.SerializerMethodField()
+
+    class Meta:
+        model = HabitStats
+        fields = ('current_streak', 'longest_streak', 'total_completions',
+                  'last_completed_on', 'completions_7d', 'completions_30d')
+
+    def today(self, stats):
+        return timezone.now().astimezone(stats.habit.user.tzinfo).date()
+
+    def get_current_streak(self, stats):
+        return stats.streak_on(self.today(stats), stats.habit.periodicity)
+
+    def get_completions_7d(self, stats):
+        return stats.completions_since(7, self.today(stats))
+
+    def get_completions_30d(self, stats):
+        return stats.completions_since(30, self.today(stats))
+
+
+class RelatedHabitField(serializers.PrimaryKeyRelatedField):
+    """Связанная привычка; при массовых операциях берётся из заранее
+    загруженного context['related_habits'] без запроса на каждый элемент"""
+
+    def to_internal_value(self, data):
+        habits = self.context.get('related_habits')
+        if habits is None:
+            return super().to_internal_value(data)
+
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return habits[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
 class HabitSerializer(serializers.ModelSerializer):
+    serializer_related_field = RelatedHabitField
     user = UserSerializer(read_only=True)
+    stats = serializers.SerializerMethodField()
 
     class Meta:
         model = Habit
-        fields = '__all__'
+        exclude = ('reminder_slot',)
         read_only_fields = ('user', 'created_at', 'updated_at')
 
+    def get_stats(self, habit):
+        # Статистика подгружается вместе с привычкой (select_related)
+        try:
+            stats = habit.stats
+        except HabitStats.DoesNotExist:
+            stats = HabitStats(habit=habit)
+        return HabitStatsSerializer(stats, context=self.context).data
+
     def validate(self, data):
         # Проверка на связанную привычку и вознаграждение
         if data.get('related_habit') and data.get('reward'):
@@ -56,10 +111,43 @@ class HabitSerializer(serializers.ModelSerializer):
 class HabitCompletionSerializer(serializers.ModelSerializer):
     class Meta:
         model = HabitCompletion
-        fields = '__all__'
+        fields = ('id', 'habit', 'completed_at', 'is_completed', 'client_id')
         read_only_fields = ('completed_at',)
 
 
+class CompleteHabitSerializer(serializers.Serializer):
+    client_id = serializers.UUIDField(required=False, allow_null=True)
+
+
+class CompletionSyncSerializer(serializers.Serializer):
+    """Выполнение, записанное клиентом (в том числе без сети)"""
+    habit = serializers.IntegerField()
+    client_id = serializers.UUIDField()
+    completed_at = serializers.DateTimeField(required=False)
+    is_completed = serializers.BooleanField(default=True)
+
+
+class HistoryQuerySerializer(serializers.Serializer):
+    """Параметры истории выполнений; даты — в часовом поясе пользователя"""
+    period = serializers.ChoiceField(choices=list(PERIODS), default='day')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, data):
+        user = self.context['request'].user
+        end = data.get('end') or timezone.now().astimezone(user.tzinfo).date()
+        start = data.get('start') or end - timedelta(HISTORY_DEFAULT_DAYS - 1)
+        if start > end:
+            raise serializers.ValidationError(
+                'Начало периода позже его конца.'
+            )
+        if (end - start).days >= HISTORY_MAX_DAYS:
+            raise serializers.ValidationError(
+                f'Период не длиннее {HISTORY_MAX_DAYS} дней.'
+            )
+        return {**data, 'start': start, 'end': end}
+
+
 class PublicHabitSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .conditional import touch_user_habits
+from .history import bump_history_version
+from .feed import (
+    PUBLIC_HABIT_FIELDS,
+    PUBLIC_USER_FIELDS,
+    bump_public_feed_version,
+)
+from .models import Habit
+
+
+@receiver(post_init, sender=settings.AUTH_USER_MODEL)
+def remember_timezone(sender, instance, **kwargs):
+    # Отложенное поле (.only() без timezone) не загружаем
+    instance._loaded_timezone = instance.__dict__.get('timezone')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reschedule_user_habits(sender, instance, created, update_fields=None,
+                           **kwargs):
+    """Пересчитать напоминания пользователя при смене часового пояса"""
+    loaded_timezone = instance._loaded_timezone
+    instance._loaded_timezone = instance.__dict__.get('timezone')
+    if created:
+        return
+    if update_fields is not None and 'timezone' not in update_fields:
+        return
+    if instance._loaded_timezone == loaded_timezone:
+        return
+
+    habits = list(Habit.objects.filter(user=instance))
+    now = timezone.now()
+    for habit in habits:
+        habit.user = instance
+        habit.schedule_on_save(now)
+        habit.updated_at = now
+    Habit.objects.bulk_update(habits, ['next_fire_at', 'updated_at'])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_public_feed_on_user_save(sender, instance, created,
+                                        update_fields=None, **kwargs):
+    """Имя и контакты владельца видны в публичной ленте"""
+    if created:
+        return
+    if update_fields is not None and not (PUBLIC_USER_FIELDS &
+                                          set(update_fields)):
+        return
+    if instance.habits.filter(is_public=True).exists():
+        transaction.on_commit(bump_public_feed_version)
+
+
+@receiver(post_init, sender=Habit)
+def remember_visibility(sender, instance, **kwargs):
+    # Отложенное поле (.only() без is_public) не загружаем
+    instance._was_public = instance.__dict__.get('is_public', False)
+
+
+@receiver(post_save, sender=Habit)
+def invalidate_public_feed_on_save(sender, instance, update_fields=None,
+                                   **kwargs):
+    """Сбросить кеш ленты, если изменилась публичная привычка или
+    привычка стала публичной или личной"""
+    was_public = instance._was_public
+    instance._was_public = instance.is_public
+    if not (was_public or instance.is_public):
+        return
+    if update_fields is not None and not (PUBLIC_HABIT_FIELDS &
+                                          set(update_fields)):
+        return
+    transaction.on_commit(bump_public_feed_version)
+
+
+@receiver(post_delete, sender=Habit)
+def touch_user_habits_on_delete(sender, instance, **kwargs):
+    """Удаление не меняет max(updated_at) списка: нужна отметка времени.
+    Выполнения удалённой привычки пропадают и из истории пользователя"""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: touch_user_habits(user_id))
+    transaction.on_commit(lambda: bump_history_version(user_id))
+
+
+@receiver(post_delete, sender=Habit)
+def invalidate_public_feed_on_delete(sender, instance, **kwargs):
+    if instance._was_public or instance.__dict__.get('is_public'):
+        transaction.on_commit(bump_public_feed_version)
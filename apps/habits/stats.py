@@ -0,0 +1,111 @@
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from .conditional import touch_user_habits
+from .history import bump_history_version
+from .models import Habit, HabitCompletion, HabitStats
+
+STATS_FIELDS = ['current_streak', 'longest_streak', 'total_completions',
+                'last_completed_on', 'day_counts', 'updated_at']
+
+
+def local_day(moment, user):
+    return moment.astimezone(user.tzinfo).date()
+
+
+def build_stats(habits):
+    """Статистика привычек заново по всей истории выполнений"""
+    habits = {habit.pk: habit for habit in habits}
+    stats = {pk: HabitStats(habit=habit) for pk, habit in habits.items()}
+    history = (
+        HabitCompletion.objects
+        .filter(habit_id__in=habits, is_completed=True)
+        .order_by('habit_id', 'completed_at')
+        .values_list('habit_id', 'completed_at')
+    )
+    for habit_id, completed_at in history.iterator(chunk_size=2000):
+        habit = habits[habit_id]
+        stats[habit_id].record(local_day(completed_at, habit.user),
+                               habit.periodicity)
+    return list(stats.values())
+
+
+def rebuild_stats(habits):
+    """Пересчитать и сохранить статистику привычек (с загруженным user)"""
+    stats = build_stats(habits)
+    HabitStats.objects.bulk_create(
+        stats,
+        update_conflicts=True,
+        unique_fields=['habit'],
+        update_fields=STATS_FIELDS
+    )
+    return stats
+
+
+def record_completions(completions):
+    """Учесть новые выполнения в статистике их привычек.
+
+    Строки статистики блокируются до конца транзакции, поэтому
+    параллельные выполнения одной привычки не теряют обновления.
+    Выполнение задним числом (раньше последнего периода) пересчитывает
+    статистику привычки по истории.
+    """
+    by_habit = defaultdict(list)
+    for completion in completions:
+        if completion.is_completed:
+            by_habit[completion.habit_id].append(completion.completed_at)
+    if not by_habit:
+        return
+
+    # Вызывающий код обычно уже в транзакции вместе с записью выполнений
+    with transaction.atomic(savepoint=False):
+        HabitStats.objects.bulk_create(
+            [HabitStats(habit_id=habit_id) for habit_id in by_habit],
+            ignore_conflicts=True
+        )
+        locked = list(
+            HabitStats.objects
+            .select_for_update(of=('self',))
+            .select_related('habit__user')
+            .filter(habit_id__in=by_habit)
+        )
+
+        rebuild, backdated = [], set()
+        for stats in locked:
+            habit = stats.habit
+            today = local_day(timezone.now(), habit.user)
+            for completed_at in sorted(by_habit[habit.pk]):
+                day = local_day(completed_at, habit.user)
+                if day < today:
+                    backdated.add(habit.user_id)
+                if not stats.record(day, habit.periodicity):
+                    rebuild.append(habit)
+                    break
+
+        rebuilt = {item.habit_id: item for item in build_stats(rebuild)}
+        for stats in locked:
+            if stats.habit_id in rebuilt:
+                for field in STATS_FIELDS[:-1]:
+                    setattr(stats, field,
+                            getattr(rebuilt[stats.habit_id], field))
+            stats.updated_at = timezone.now()
+        HabitStats.objects.bulk_update(locked, STATS_FIELDS)
+
+        # Статистика входит в ответы со списком привычек (см. ETag), а
+        # выполнение задним числом меняет закешированную историю
+        for user_id in {stats.habit.user_id for stats in locked}:
+            transaction.on_commit(
+                lambda user_id=user_id: touch_user_habits(user_id)
+            )
+        for user_id in backdated:
+            transaction.on_commit(
+                lambda user_id=user_id: bump_history_version(user_id)
+            )
+
+
+def without_stats(habits):
+    """Отметить новые привычки как не имеющие статистики, чтобы
+    сериализация не запрашивала её по одной"""
+    for habit in habits:
+        Habit.stats.related.set_cached_value(habit, None)
+    return habits
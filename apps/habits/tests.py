@@ -1,8 +1,20 @@
+import csv
+import json
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import Habit
+from .fast import habit_rows, public_habit_rows
+from .models import Habit, HabitCompletion, HabitStats
+from .serializers import HabitSerializer, PublicHabitSerializer
+from .stats import record_completions
 
 User = get_user_model()
 
@@ -41,6 +53,7 @@ class HabitModelTest(TestCase):
 
 class HabitAPITest(APITestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(
             username='testuser',
             password='testpass123',
@@ -83,10 +96,754 @@ class HabitAPITest(APITestCase):
         response = self.client.get('/api/public/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_public_habits_cursor_pagination(self):
+        habits = [Habit.objects.create(user=self.user, **self.habit_data)
+                  for _ in range(12)]
+
+        seen = []
+        url = '/api/public/?pagination=cursor'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen.extend(habit['id'] for habit in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(seen, [habit.id for habit in reversed(habits)])
+
+        # Навигация по номеру страницы осталась по умолчанию
+        response = self.client.get('/api/habits/?page=3')
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual(len(response.data['results']), 2)
+
     def test_complete_habit(self):
         habit = Habit.objects.create(user=self.user, **self.habit_data)
         response = self.client.post(f'/api/habits/{habit.id}/complete/')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(set(response.data), {
+            'id', 'habit', 'completed_at', 'is_completed', 'client_id'
+        })
+
+
+class HabitQueryBudgetTest(APITestCase):
+    """Число запросов к базе не должно зависеть от числа привычек"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            telegram_chat_id='123456'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.habit_data = {
+            'place': 'Парк',
+            'time': '08:00:00',
+            'action': 'Утренняя пробежка',
+            'execution_time': 90,
+            'is_public': True
+        }
+        # Полная страница привычек разных пользователей
+        self.habits = [Habit.objects.create(user=self.user,
+                                            **self.habit_data)]
+        for i in range(4):
+            owner = User.objects.create_user(username=f'owner{i}',
+                                             password='testpass123')
+            Habit.objects.create(user=owner, **self.habit_data)
+            self.habits.append(
+                Habit.objects.create(user=self.user, **self.habit_data)
+            )
+
+    # Списки: ETag и Last-Modified, число записей, страница
+
+    def test_list_habits(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/habits/')
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_public_habits(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/public/')
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_cursor_pages_skip_count(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/public/?pagination=cursor')
+        with self.assertNumQueries(2):
+            self.client.get(response.data['next'])
+        with self.assertNumQueries(2):
+            self.client.get('/api/habits/?pagination=cursor')
+
+    def test_not_modified_list_skips_page(self):
+        response = self.client.get('/api/habits/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/habits/',
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_habit(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/habits/{self.habits[0].id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_create_habit(self):
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/habits/', self.habit_data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_update_habit(self):
+        url = f'/api/habits/{self.habits[0].id}/'
+        with self.assertNumQueries(3):
+            response = self.client.patch(url, {'action': 'Прогулка'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(3):
+            response = self.client.put(url, self.habit_data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_complete_habit(self):
+        url = f'/api/habits/{self.habits[0].id}/complete/'
+        # Выполнение и статистика: вставка, блокировка, обновление
+        with self.assertNumQueries(7):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_delete_habit(self):
+        # Выборка и каскадное удаление связанных записей
+        with self.assertNumQueries(7):
+            response = self.client.delete(f'/api/habits/{self.habits[0].id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class PublicFeedCacheTest(APITestCase):
+    """Публичная лента отдаётся из кеша и сбрасывается сигналами"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.public = Habit.objects.create(
+            user=self.user, place='Парк', time='08:00:00',
+            action='Пробежка', execution_time=90, is_public=True
+        )
+        self.private = Habit.objects.create(
+            user=self.user, place='Дом', time='09:00:00',
+            action='Зарядка', execution_time=60
+        )
+
+    def feed_ids(self):
+        response = self.client.get('/api/public/')
+        return [habit['id'] for habit in response.data['results']]
+
+    def test_repeated_request_skips_database(self):
+        self.assertEqual(self.feed_ids(), [self.public.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.feed_ids(), [self.public.id])
+
+    def test_visibility_change_invalidates_feed(self):
+        self.feed_ids()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.private.is_public = True
+            self.private.save()
+        self.assertEqual(set(self.feed_ids()),
+                         {self.public.id, self.private.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.public.is_public = False
+            self.public.save()
+        self.assertEqual(self.feed_ids(), [self.private.id])
+
+    def test_public_habit_delete_invalidates_feed(self):
+        self.feed_ids()
+        with self.captureOnCommitCallbacks(execute=True):
+            Habit.objects.get(pk=self.public.pk).delete()
+        self.assertEqual(self.feed_ids(), [])
+
+    def test_public_owner_change_invalidates_feed(self):
+        self.feed_ids()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.username = 'renamed'
+            self.user.save()
+        response = self.client.get('/api/public/')
+        self.assertEqual(response.data['results'][0]['user']['username'],
+                         'renamed')
+
+    def test_private_changes_keep_cache(self):
+        self.feed_ids()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.private.action = 'Растяжка'
+            self.private.save()
+            self.public.next_fire_at = None
+            self.public.save(update_fields=['next_fire_at'])
+        self.assertEqual(callbacks, [])
+        with self.assertNumQueries(0):
+            self.feed_ids()
+
+
+class BulkHabitAPITest(APITestCase):
+    """Массовые операции: один запрос и постоянное число запросов к базе"""
+
+    url = '/api/habits/bulk/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.pleasant = Habit.objects.create(
+            user=self.user, place='Дом', time='20:00:00',
+            action='Ванна', execution_time=60, is_pleasant=True
+        )
+
+    def habit_data(self, i, **extra):
+        return {'place': 'Парк', 'time': '08:00:00',
+                'action': f'Привычка {i}', 'execution_time': 60, **extra}
+
+    def test_bulk_create_uses_constant_queries(self):
+        items = [self.habit_data(i, related_habit=self.pleasant.id)
+                 for i in range(50)]
+        # Связанные привычки, точка сохранения, вставка, освобождение
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 50)
+        self.assertEqual(Habit.objects.filter(user=self.user).count(), 51)
+        self.assertTrue(all(habit['next_fire_at'] and habit['id']
+                            for habit in response.data))
+
+    def test_bulk_create_reports_errors_per_item(self):
+        other = Habit.objects.create(
+            user=self.user, place='Дом', time='07:00:00',
+            action='Зарядка', execution_time=60
+        )
+        items = [
+            self.habit_data(0),
+            self.habit_data(1, execution_time=200),
+            self.habit_data(2, related_habit=other.id),
+            self.habit_data(3, related_habit=999999),
+            self.habit_data(4, periodicity='weekly'),
+        ]
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('non_field_errors', response.data[1])
+        self.assertIn('non_field_errors', response.data[2])
+        self.assertIn('related_habit', response.data[3])
+        self.assertIn('day_of_week', response.data[4])
+        self.assertEqual(Habit.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_update(self):
+        habits = [Habit.objects.create(user=self.user, **self.habit_data(i))
+                  for i in range(3)]
+        items = [{'id': habit.id, 'action': f'Новая {habit.id}'}
+                 for habit in habits]
+        response = self.client.patch(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for habit in habits:
+            habit.refresh_from_db()
+            self.assertEqual(habit.action, f'Новая {habit.id}')
+
+    def test_bulk_update_rejects_foreign_and_unknown_ids(self):
+        other_user = User.objects.create_user(username='other',
+                                              password='testpass123')
+        foreign = Habit.objects.create(user=other_user, **self.habit_data(0))
+        items = [{'id': self.pleasant.id, 'action': 'Душ'},
+                 {'id': foreign.id, 'action': 'Чужая'},
+                 {'action': 'Без id'}]
+        response = self.client.patch(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('id', response.data[1])
+        self.assertIn('id', response.data[2])
+        self.pleasant.refresh_from_db()
+        self.assertEqual(self.pleasant.action, 'Ванна')
+
+    def test_bulk_delete(self):
+        habits = [Habit.objects.create(user=self.user, **self.habit_data(i))
+                  for i in range(3)]
+        response = self.client.delete(
+            self.url, [habit.id for habit in habits[:2]], format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            list(Habit.objects.filter(user=self.user).order_by('id')),
+            [self.pleasant, habits[2]]
+        )
+
+    def test_bulk_create_invalidates_public_feed(self):
+        self.assertEqual(self.client.get('/api/public/').data['count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, [self.habit_data(0, is_public=True)],
+                             format='json')
+        self.assertEqual(self.client.get('/api/public/').data['count'], 1)
+
+    def test_rejects_non_list_payload(self):
+        response = self.client.post(self.url, self.habit_data(0),
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CompletionSyncTest(APITestCase):
+    """Идемпотентная загрузка выполнений, накопленных без сети"""
+
+    url = '/api/habits/completions/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.habits = [
+            Habit.objects.create(user=self.user, place='Парк',
+                                 time='08:00:00', action=f'Привычка {i}',
+                                 execution_time=60)
+            for i in range(2)
+        ]
+        self.items = [
+            {'habit': self.habits[0].id,
+             'client_id': '9b2f6a3e-0d8c-4f5e-9a41-1f7c2e3d4b51',
+             'completed_at': '2024-05-01T07:30:00Z'},
+            {'habit': self.habits[1].id,
+             'client_id': '0c6e7d1a-52b4-4a0f-8e3b-6d9c1f2a7e84'},
+            {'habit': self.habits[0].id,
+             'client_id': '9b2f6a3e-0d8c-4f5e-9a41-1f7c2e3d4b51'},
+        ]
+
+    def statuses(self, response):
+        return [result['status'] for result in response.data]
+
+    def test_batch_is_written_once(self):
+        response = self.client.post(self.url, self.items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.statuses(response),
+                         ['created', 'created', 'duplicate'])
+        completion = HabitCompletion.objects.get(habit=self.habits[0])
+        self.assertEqual(completion.completed_at.isoformat(),
+                         '2024-05-01T07:30:00+00:00')
+
+        # Повтор после обрыва связи: владение и ключи — два запроса
+        with self.assertNumQueries(2):
+            response = self.client.post(self.url, self.items, format='json')
+        self.assertEqual(self.statuses(response), ['duplicate'] * 3)
+        self.assertEqual(HabitCompletion.objects.count(), 2)
+
+    def test_parallel_replay_is_not_counted_twice(self):
+        self.client.post(self.url, self.items[:1], format='json')
+        # Параллельный запрос не видит ещё не зафиксированную строку
+        with mock.patch('apps.habits.bulk.existing_completions',
+                        return_value=set()):
+            response = self.client.post(self.url, self.items[:1],
+                                        format='json')
+        self.assertEqual(self.statuses(response), ['duplicate'])
+        self.assertEqual(HabitCompletion.objects.count(), 1)
+        stats = HabitStats.objects.get(habit=self.habits[0])
+        self.assertEqual(stats.total_completions, 1)
+        self.assertEqual(sum(stats.day_counts), 1)
+
+    def test_invalid_and_foreign_items_are_reported(self):
+        other_user = User.objects.create_user(username='other',
+                                              password='testpass123')
+        foreign = Habit.objects.create(user=other_user, place='Дом',
+                                       time='09:00:00', action='Чужая',
+                                       execution_time=60)
+        items = [
+            self.items[0],
+            {'habit': foreign.id,
+             'client_id': '5d1e2f3a-4b5c-4d6e-8f70-8192a3b4c5d6'},
+            {'habit': self.habits[1].id, 'client_id': 'не-uuid'},
+        ]
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(self.statuses(response),
+                         ['created', 'error', 'error'])
+        self.assertIn('habit', response.data[1]['errors'])
+        self.assertIn('client_id', response.data[2]['errors'])
+        self.assertEqual(HabitCompletion.objects.count(), 1)
+
+    def test_complete_with_client_id_is_idempotent(self):
+        url = f'/api/habits/{self.habits[0].id}/complete/'
+        data = {'client_id': self.items[0]['client_id']}
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(HabitCompletion.objects.count(), 1)
+
+
+class HabitStatsTest(APITestCase):
+    """Статистика обновляется при выполнении и совпадает с пересчётом"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            timezone='Europe/Moscow'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(
+            user=self.user, place='Парк', time='08:00:00',
+            action='Пробежка', execution_time=60
+        )
+        self.day = date(2024, 5, 1)
+
+    def record(self, stats, *offsets, periodicity='daily'):
+        for offset in offsets:
+            stats.record(self.day + timedelta(offset), periodicity)
+
+    def test_daily_streaks(self):
+        stats = HabitStats(habit=self.habit)
+        self.record(stats, 0, 1, 1, 2, 5, 6)
+        self.assertEqual(stats.total_completions, 6)
+        self.assertEqual(stats.current_streak, 2)
+        self.assertEqual(stats.longest_streak, 3)
+        self.assertEqual(stats.last_completed_on, self.day + timedelta(6))
+
+        last = stats.last_completed_on
+        self.assertEqual(stats.streak_on(last + timedelta(1), 'daily'), 2)
+        self.assertEqual(stats.streak_on(last + timedelta(2), 'daily'), 0)
+
+    def test_weekly_streak_counts_weeks(self):
+        stats = HabitStats(habit=self.habit)
+        # 1 мая 2024 — среда: две среды подряд и пятница той же недели
+        self.record(stats, 0, 7, 9, periodicity='weekly')
+        self.assertEqual(stats.current_streak, 2)
+        self.record(stats, 21, periodicity='weekly')
+        self.assertEqual(stats.current_streak, 1)
+
+    def test_rolling_counts(self):
+        stats = HabitStats(habit=self.habit)
+        self.record(stats, 0, 20, 30, 31, 35, 35)
+        today = self.day + timedelta(36)
+        self.assertEqual(stats.completions_since(7, today), 4)
+        self.assertEqual(stats.completions_since(30, today), 5)
+        self.assertEqual(
+            stats.completions_since(7, today + timedelta(30)), 0
+        )
+
+    def test_completion_updates_stats_and_matches_rebuild(self):
+        self.client.post(f'/api/habits/{self.habit.id}/complete/')
+        backdated = {
+            'habit': self.habit.id,
+            'client_id': '2f1c0d9e-8b7a-4c6d-9e5f-4a3b2c1d0e9f',
+            'completed_at': '2024-05-01T10:00:00Z',
+        }
+        self.client.post('/api/habits/completions/', [backdated],
+                         format='json')
+
+        response = self.client.get(f'/api/habits/{self.habit.id}/')
+        self.assertEqual(response.data['stats']['total_completions'], 2)
+        self.assertEqual(response.data['stats']['current_streak'], 1)
+        self.assertEqual(response.data['stats']['completions_7d'], 1)
+
+        incremental = HabitStats.objects.get(habit=self.habit)
+        HabitStats.objects.all().delete()
+        call_command('rebuild_habit_stats', stdout=StringIO())
+        rebuilt = HabitStats.objects.get(habit=self.habit)
+        for field in ('current_streak', 'longest_streak',
+                      'total_completions', 'last_completed_on',
+                      'day_counts'):
+            self.assertEqual(getattr(rebuilt, field),
+                             getattr(incremental, field))
+
+    def test_new_habit_has_empty_stats(self):
+        response = self.client.post('/api/habits/', {
+            'place': 'Дом', 'time': '09:00:00', 'action': 'Зарядка',
+            'execution_time': 60
+        })
+        self.assertEqual(response.data['stats']['total_completions'], 0)
+        self.assertIsNone(response.data['stats']['last_completed_on'])
+
+
+class CompletionHistoryTest(APITestCase):
+    """История выполнений группируется базой по периодам"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            timezone='Europe/Moscow'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.habits = [
+            Habit.objects.create(user=self.user, place='Парк',
+                                 time='08:00:00', action=f'Привычка {i}',
+                                 execution_time=60)
+            for i in range(2)
+        ]
+        for habit, moment in [
+            (self.habits[0], '2024-05-01T07:00:00Z'),
+            (self.habits[0], '2024-05-01T12:00:00Z'),
+            # 2 мая по Москве
+            (self.habits[0], '2024-05-01T22:30:00Z'),
+            (self.habits[0], '2024-06-10T09:00:00Z'),
+            (self.habits[1], '2024-05-02T09:00:00Z'),
+        ]:
+            HabitCompletion.objects.create(habit=habit, completed_at=moment)
+        self.url = f'/api/habits/{self.habits[0].id}/history/'
+        self.range = '&start=2024-04-01&end=2024-06-30'
+
+    def buckets(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(bucket['date'], bucket['count'])
+                for bucket in response.data['buckets']]
+
+    def test_daily_buckets_in_user_timezone(self):
+        self.assertEqual(self.buckets(self.url + '?period=day' + self.range),
+                         [('2024-05-01', 2), ('2024-05-02', 1),
+                          ('2024-06-10', 1)])
+
+    def test_weekly_and_monthly_buckets(self):
+        self.assertEqual(
+            self.buckets(self.url + '?period=week' + self.range),
+            [('2024-04-29', 3), ('2024-06-10', 1)]
+        )
+        self.assertEqual(
+            self.buckets('/api/habits/history/?period=month' + self.range),
+            [('2024-05-01', 4), ('2024-06-01', 1)]
+        )
+
+    def test_closed_periods_are_cached(self):
+        url = '/api/habits/history/?period=day' + self.range
+        self.buckets(url)
+        with self.assertNumQueries(0):
+            self.buckets(url)
+
+        backdated = {'habit': self.habits[1].id,
+                     'client_id': '7a6b5c4d-3e2f-4a1b-8c9d-0e1f2a3b4c5d',
+                     'completed_at': '2024-05-02T10:00:00Z'}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/habits/completions/', [backdated],
+                             format='json')
+        self.assertIn(('2024-05-02', 3), self.buckets(url))
+
+    def test_invalid_query(self):
+        response = self.client.get(self.url + '?period=year')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url + '?start=2020-01-01')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RowSerializerTest(TestCase):
+    """Быстрая сериализация списков совпадает с DRF байт в байт"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            email='test@example.com',
+            telegram_chat_id='123456',
+            timezone='Asia/Tokyo'
+        )
+        other = User.objects.create_user(username='other',
+                                         password='testpass123')
+        pleasant = Habit.objects.create(
+            user=self.user, place='Дом', time='20:00:00', action='Ванна',
+            execution_time=60, is_pleasant=True, is_public=True
+        )
+        weekly = Habit.objects.create(
+            user=self.user, place='Зал', time='07:15:30',
+            action='Тренировка', execution_time=120, periodicity='weekly',
+            day_of_week=3, related_habit=pleasant
+        )
+        Habit.objects.create(
+            user=other, place='Парк', time='08:00:00', action='Пробежка',
+            execution_time=90, reward='Кофе', is_public=True
+        )
+        for days in (0, 1, 40):
+            completion = HabitCompletion.objects.create(
+                habit=weekly,
+                completed_at=timezone.now() - timedelta(days=days)
+            )
+            record_completions([completion])
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_habit_rows_match_habit_serializer(self):
+        queryset = (Habit.objects.select_related('user', 'stats')
+                    .order_by('-created_at', '-id'))
+        self.assertEqual(
+            self.render(habit_rows.to_representation(
+                habit_rows.values(queryset)
+            )),
+            self.render(HabitSerializer(queryset, many=True).data)
+        )
+
+    def test_public_rows_match_public_serializer(self):
+        queryset = (Habit.objects.filter(is_public=True)
+                    .select_related('user').order_by('-created_at', '-id'))
+        self.assertEqual(
+            self.render(public_habit_rows.to_representation(
+                public_habit_rows.values(queryset)
+            )),
+            self.render(PublicHabitSerializer(queryset, many=True).data)
+        )
+
+
+class HabitExportTest(APITestCase):
+    """Потоковая выгрузка привычек с историей выполнений"""
+
+    url = '/api/export/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.habits = [
+            Habit.objects.create(user=self.user, place='Парк',
+                                 time='08:00:00', action=f'Привычка {i}',
+                                 execution_time=60)
+            for i in range(3)
+        ]
+        for habit, moment in [
+            (self.habits[2], '2024-05-01T07:00:00Z'),
+            (self.habits[0], '2024-05-02T07:00:00Z'),
+            (self.habits[0], '2024-05-01T07:00:00Z'),
+        ]:
+            HabitCompletion.objects.create(habit=habit, completed_at=moment)
+        other = User.objects.create_user(username='other',
+                                         password='testpass123')
+        foreign = Habit.objects.create(user=other, place='Дом',
+                                       time='09:00:00', action='Чужая',
+                                       execution_time=60)
+        HabitCompletion.objects.create(habit=foreign)
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_interleaves_completions(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line)
+                   for line in self.content(response).splitlines()]
+        self.assertEqual(
+            [(record['record'], record.get('habit', record['id']))
+             for record in records],
+            [('habit', self.habits[0].id),
+             ('completion', self.habits[0].id),
+             ('completion', self.habits[0].id),
+             ('habit', self.habits[1].id),
+             ('habit', self.habits[2].id),
+             ('completion', self.habits[2].id)]
+        )
+        self.assertEqual(records[1]['completed_at'], '2024-05-01T07:00:00Z')
+        self.assertEqual(records[0]['action'], 'Привычка 0')
+
+    def test_csv(self):
+        response = self.client.get(self.url + '?output=csv',
+                                   HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.reader(self.content(response).splitlines()))
+        self.assertEqual(rows[0][:3], ['record', 'id', 'place'])
+        self.assertEqual([row[0] for row in rows[1:]],
+                         ['habit', 'completion', 'completion', 'habit',
+                          'habit', 'completion'])
+
+    def test_other_users_export_requires_staff(self):
+        url = f'{self.url}?user={self.habits[0].user_id}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = User.objects.create_user(username='admin',
+                                         password='testpass123',
+                                         is_staff=True)
+        self.client.force_authenticate(user=admin)
+        lines = self.content(self.client.get(url)).splitlines()
+        self.assertEqual(len(lines), 6)
+
+    def test_invalid_user_param(self):
+        admin = User.objects.create_user(username='admin',
+                                         password='testpass123',
+                                         is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(self.url + '?user=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('user', response.json())
+
+    def test_unknown_output(self):
+        response = self.client.get(self.url + '?output=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConditionalGetTest(APITestCase):
+    """ETag и Last-Modified: 304 для неизменившихся данных"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.habit = Habit.objects.create(
+            user=self.user, place='Парк', time='08:00:00',
+            action='Пробежка', execution_time=90, is_public=True
+        )
+        self.other = Habit.objects.create(
+            user=self.user, place='Дом', time='09:00:00',
+            action='Зарядка', execution_time=60
+        )
+
+    def assertRevalidates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+        not_modified = self.client.get(url,
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(not_modified.content, b'')
+        not_modified = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(not_modified.status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+        return response['ETag']
+
+    def test_list_detail_and_public_feed(self):
+        self.assertRevalidates('/api/habits/')
+        self.assertRevalidates(f'/api/habits/{self.habit.id}/')
+        self.assertRevalidates('/api/public/')
+
+    def test_change_produces_new_etag(self):
+        list_etag = self.assertRevalidates('/api/habits/')
+        detail_url = f'/api/habits/{self.habit.id}/'
+        detail_etag = self.assertRevalidates(detail_url)
+
+        self.client.patch(detail_url, {'action': 'Прогулка'})
+        response = self.client.get('/api/habits/',
+                                   HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(detail_url,
+                                   HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.data['action'], 'Прогулка')
+
+    def test_delete_produces_new_etag(self):
+        etag = self.assertRevalidates('/api/habits/?page=1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/habits/{self.other.id}/')
+        response = self.client.get('/api/habits/?page=1',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_cached_public_feed_revalidates_without_database(self):
+        self.client.force_authenticate(user=None)
+        etag = self.assertRevalidates('/api/public/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/public/',
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
 
 
 class AuthAPITest(APITestCase):
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import HabitViewSet, PublicHabitListView
+from .views import HabitExportView, HabitViewSet, PublicHabitListView
 
 router = DefaultRouter()
 router.register(r'habits', HabitViewSet, basename='habit')
@@ -8,4 +8,5 @@ router.register(r'habits', HabitViewSet, basename='habit')
 urlpatterns = [
     path('', include(router.urls)),
     path('public/', PublicHabitListView.as_view(), name='public-habits'),
+    path('export/', HabitExportView.as_view(), name='habit-export'),
 ]
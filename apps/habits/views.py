@@ -1,35 +1,293 @@
+from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, generics, status
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
+from .bulk import (
+    bulk_create_completions,
+    bulk_create_habits,
+    bulk_delete_habits,
+    bulk_update_habits,
+)
+from .conditional import (
+    list_validators,
+    make_etag,
+    not_modified,
+    set_validators,
+    user_habits_changed_at,
+)
+from .feed import (
+    cache_public_feed,
+    get_cached_public_feed,
+    public_feed_changed_at,
+)
 from .models import Habit, HabitCompletion
 from .serializers import HabitSerializer, HabitCompletionSerializer
+from .serializers import CompleteHabitSerializer, HistoryQuerySerializer
+from .history import completion_history
+from .export import EXPORT_FORMATS, chunked, export_records
+from .fast import habit_rows, public_habit_rows
+from .stats import record_completions, without_stats
 from .serializers import PublicHabitSerializer
+from .pagination import HabitPagination
 from .permissions import IsOwner
 
 
+def rows_response(view, rows):
+    """Страница списка через values(): без создания моделей и без
+    ModelSerializer, но с тем же ответом (см. fast.py)"""
+    queryset = rows.values(view.filter_queryset(view.get_queryset()))
+    page = view.paginate_queryset(queryset)
+    if page is None:
+        return Response(rows.to_representation(queryset))
+    return view.get_paginated_response(rows.to_representation(page))
+
+
 class HabitViewSet(viewsets.ModelViewSet):
     serializer_class = HabitSerializer
     permission_classes = [IsAuthenticated, IsOwner]
+    pagination_class = HabitPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['is_pleasant', 'periodicity', 'is_public']
+    bulk_max_items = 1000
 
     def get_queryset(self):
-        return Habit.objects.filter(user=self.request.user)
+        return (
+            Habit.objects
+            .filter(user=self.request.user)
+            .select_related('user', 'stats')
+            .order_by('-created_at', '-id')
+        )
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        without_stats([serializer.save(user=self.request.user)])
+
+    def user_seed(self):
+        # Владелец вложен в каждую привычку ответа, а счётчики статистики
+        # за 7 и 30 дней меняются со сменой дня
+        user = self.request.user
+        today = timezone.now().astimezone(user.tzinfo).date()
+        return user.username, user.email, user.telegram_chat_id, today
+
+    def list(self, request, *args, **kwargs):
+        # Клиенты опрашивают список: неизменившийся список не сериализуем
+        etag, last_modified = list_validators(
+            request,
+            self.filter_queryset(self.get_queryset()),
+            changed_at=user_habits_changed_at(request.user.id),
+            seed=self.user_seed()
+        )
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = rows_response(self, habit_rows)
+            set_validators(response, etag, last_modified)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        habit = self.get_object()
+        stats = getattr(habit, 'stats', None)
+        changed = [habit.updated_at] + ([stats.updated_at] if stats else [])
+        last_modified = int(max(changed).timestamp())
+        # related_habit обнуляется при удалении связанной привычки
+        # без обновления updated_at
+        etag = make_etag(habit.pk, habit.related_habit_id, self.user_seed(),
+                         *(moment.timestamp() for moment in changed))
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = Response(self.get_serializer(habit).data)
+            set_validators(response, etag, last_modified)
+        return response
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        """Массовые операции одним запросом: POST — создать привычки из
+        списка, PATCH — изменить (каждый элемент с id), DELETE — удалить
+        список id. Изменения применяются, только если верны все элементы,
+        иначе возвращаются ошибки по каждому элементу"""
+        items = request.data
+        self.validate_bulk_payload(items)
+
+        if request.method == 'DELETE':
+            errors = bulk_delete_habits(request.user, items)
+            if errors:
+                raise ValidationError(errors)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if request.method == 'POST':
+            habits, errors = bulk_create_habits(items,
+                                                self.get_serializer_context())
+            code = status.HTTP_201_CREATED
+        else:
+            habits, errors = bulk_update_habits(items,
+                                                self.get_serializer_context())
+            code = status.HTTP_200_OK
+        if errors:
+            raise ValidationError(errors)
+        return Response(self.get_serializer(habits, many=True).data,
+                        status=code)
+
+    def validate_bulk_payload(self, items):
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'non_field_errors': ['Ожидается список.']})
+        if len(items) > self.bulk_max_items:
+            raise ValidationError({'non_field_errors': [
+                f'Не больше {self.bulk_max_items} элементов за запрос.'
+            ]})
 
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
         habit = self.get_object()
-        completion = HabitCompletion.objects.create(habit=habit)
+        key = CompleteHabitSerializer(data=request.data)
+        key.is_valid(raise_exception=True)
+        client_id = key.validated_data.get('client_id')
+
+        # Повторное нажатие с тем же client_id возвращает то же выполнение
+        with transaction.atomic():
+            if client_id is None:
+                completion, created = (
+                    HabitCompletion.objects.create(habit=habit), True
+                )
+            else:
+                completion, created = HabitCompletion.objects.get_or_create(
+                    habit=habit, client_id=client_id
+                )
+            if created:
+                record_completions([completion])
         serializer = HabitCompletionSerializer(completion)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    def history_response(self, habit_ids, scope):
+        query = HistoryQuerySerializer(data=self.request.query_params,
+                                       context=self.get_serializer_context())
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        buckets = completion_history(
+            self.request.user, habit_ids, params['period'],
+            params['start'], params['end'], scope
+        )
+        return Response({
+            'period': params['period'],
+            'start': params['start'],
+            'end': params['end'],
+            'buckets': buckets,
+        })
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Число выполнений привычки по дням, неделям или месяцам:
+        ?period=day|week|month&start=ГГГГ-ММ-ДД&end=ГГГГ-ММ-ДД"""
+        habit = self.get_object()
+        return self.history_response([habit.pk], scope=habit.pk)
+
+    @action(detail=False, methods=['get'], url_path='history')
+    def history_all(self, request):
+        """То же, что history, по всем привычкам пользователя"""
+        habit_ids = Habit.objects.filter(user=request.user).values('pk')
+        return self.history_response(habit_ids, scope='all')
+
+    @action(detail=False, methods=['post'])
+    def completions(self, request):
+        """Выполнения, накопленные клиентом без сети, одним запросом.
+
+        Каждый элемент — {habit, client_id, completed_at?, is_completed?};
+        повтор с тем же client_id не создаёт вторую запись. Ответ содержит
+        результат по каждому элементу: created, duplicate или error.
+        """
+        self.validate_bulk_payload(request.data)
+        results = bulk_create_completions(request.user, request.data)
+        return Response(results)
 
 
 class PublicHabitListView(generics.ListAPIView):
     serializer_class = PublicHabitSerializer
     permission_classes = [AllowAny]
-    queryset = Habit.objects.filter(is_public=True)
+    pagination_class = HabitPagination
+    queryset = (
+        Habit.objects
+        .filter(is_public=True)
+        .select_related('user')
+        .order_by('-created_at', '-id')
+    )
+
+    def list(self, request, *args, **kwargs):
+        # Лента одинакова для всех: страницы вместе с ETag и Last-Modified
+        # отдаются из общего кеша, который сбрасывают сигналы
+        cached = get_cached_public_feed(request)
+        if cached is None:
+            etag, last_modified = list_validators(
+                request, self.get_queryset(),
+                changed_at=public_feed_changed_at()
+            )
+            cached = (etag, last_modified, None)
+        etag, last_modified, data = cached
+
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        if data is None:
+            response = rows_response(self, public_habit_rows)
+            cache_public_feed(request, (etag, last_modified, response.data))
+        else:
+            response = Response(data)
+        return set_validators(response, etag, last_modified)
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """Формат выгрузки задаёт ?output, а не Accept (например, text/csv);
+    ошибки отдаются первым рендерером — JSON"""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix):
+        return renderers[0], renderers[0].media_type
+
+
+class HabitExportView(APIView):
+    """Выгрузка привычек и истории выполнений: ?output=ndjson|csv.
+
+    Ответ передаётся потоком по мере чтения из базы. Администратор может
+    выгрузить данные другого пользователя: ?user=<id>.
+    """
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def get(self, request):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_FORMATS:
+            raise ValidationError({'output': [
+                f'Допустимые значения: {", ".join(EXPORT_FORMATS)}.'
+            ]})
+
+        user = request.user
+        if 'user' in request.query_params:
+            if not user.is_staff:
+                raise PermissionDenied()
+            try:
+                user_id = int(request.query_params['user'])
+            except ValueError:
+                raise ValidationError({'user': [
+                    'Ожидается идентификатор пользователя.'
+                ]})
+            user = get_object_or_404(get_user_model(), pk=user_id)
+
+        content_type, lines = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(
+            chunked(lines(export_records(user))), content_type=content_type
+        )
+        response.headers['Content-Disposition'] = (
+            f'attachment; filename="habits-{user.pk}.{output}"'
+        )
+        return response
@@ -0,0 +1,25 @@
+from django.contrib import admin
+from .models import ReminderDeadLetter, ReminderDispatch, ReminderOutbox
+
+
+@admin.register(ReminderDispatch)
+class ReminderDispatchAdmin(admin.ModelAdmin):
+    list_display = ('habit', 'occurrence', 'created_at')
+    readonly_fields = ('created_at',)
+
+
+@admin.register(ReminderDeadLetter)
+class ReminderDeadLetterAdmin(admin.ModelAdmin):
+    list_display = ('chat_id', 'chat_unreachable', 'attempts', 'created_at')
+    list_filter = ('chat_unreachable',)
+    search_fields = ('chat_id', 'error')
+    readonly_fields = ('created_at',)
+
+
+@admin.register(ReminderOutbox)
+class ReminderOutboxAdmin(admin.ModelAdmin):
+    list_display = ('chat_id', 'habit', 'status', 'attempts',
+                    'available_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('chat_id',)
+    readonly_fields = ('scheduled_at', 'scanned_at', 'created_at', 'sent_at')
@@ -0,0 +1,172 @@
+import asyncio
+import itertools
+import math
+from contextlib import AsyncExitStack
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from telegram import Bot
+from telegram.constants import ParseMode
+from telegram.error import (
+    BadRequest,
+    Forbidden,
+    InvalidToken,
+    NetworkError,
+    RetryAfter,
+    TelegramError,
+)
+from telegram.request import HTTPXRequest
+from .delivery import DeliveryReport, triage
+from .outbox import lease_outbox_batch, settle_outbox_rows
+from .sender import FAILED, RETRY, SENT, BatchBreaker, telegram_breaker
+
+
+# Соединений в пуле одного клиента. Пул httpcore на каждое событие
+# перебирает все свои соединения, поэтому один большой пул упирается в
+# процессор; несколько маленьких при той же параллельности вдвое-втрое
+# дешевле
+CONNECTIONS_PER_BOT = 4
+
+
+def build_bots(concurrency):
+    """Асинхронные клиенты Bot API, вместе держащие concurrency соединений"""
+    return [
+        build_bot(CONNECTIONS_PER_BOT)
+        for _ in range(math.ceil(concurrency / CONNECTIONS_PER_BOT))
+    ]
+
+
+def build_bot(connections):
+    timeout = settings.TELEGRAM_REQUEST_TIMEOUT
+    request = HTTPXRequest(
+        connection_pool_size=connections,
+        read_timeout=timeout,
+        write_timeout=timeout,
+        connect_timeout=timeout,
+        pool_timeout=timeout,
+    )
+    return Bot(
+        settings.TELEGRAM_BOT_TOKEN,
+        base_url=f'{settings.TELEGRAM_API_URL}/bot',
+        request=request
+    )
+
+
+class AsyncReminderSender:
+    """Отправитель напоминаний из очереди в базе на одном цикле событий.
+
+    Одновременно отправляется не больше concurrency сообщений. Записи
+    очереди берутся в аренду (см. lease_outbox_batch), а следующая пачка
+    забирается, пока предыдущая ещё отправляется. Ответ 429
+    приостанавливает все отправки на retry_after секунд. Размыкатель цепи
+    сверяется с общим кешем раз в пачку (см. BatchBreaker).
+    """
+    # Сколько пачек может отправляться одновременно
+    pipeline_depth = 2
+
+    def __init__(self, bots, concurrency, batch_size, lease):
+        self.bots = itertools.cycle(bots)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.batch_size = batch_size
+        self.lease = lease
+        self.breaker = telegram_breaker()
+        self.paused_until = 0
+
+    async def send(self, payload):
+        """Отправить сообщение, вернуть результат как sender.send_message"""
+        try:
+            await next(self.bots).send_message(
+                chat_id=payload['chat_id'],
+                text=payload['text'],
+                parse_mode=ParseMode.HTML
+            )
+        except RetryAfter as e:
+            return RETRY, str(e), e.retry_after
+        except (BadRequest, Forbidden, InvalidToken) as e:
+            return FAILED, str(e), None
+        except NetworkError as e:
+            # Сеть, таймауты и 5xx
+            return RETRY, str(e), None
+        except TelegramError as e:
+            return FAILED, str(e), None
+        return SENT, None, None
+
+    async def deliver(self, payload, report, breaker):
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            while self.paused_until > loop.time():
+                await asyncio.sleep(self.paused_until - loop.time())
+
+            if breaker.is_open():
+                report.postpone([payload], breaker.cooldown)
+                return
+
+            started_at = timezone.now().timestamp()
+            status, error, wait = await self.send(payload)
+            breaker.record(status != RETRY)
+            report.add(payload, status, error, started_at,
+                       timezone.now().timestamp())
+
+            if wait:
+                # Лимит Bot API действует на всего бота, а не на чат
+                self.paused_until = max(self.paused_until,
+                                        loop.time() + wait)
+                report.postpone([], wait)
+
+    async def process_batch(self, rows):
+        report = DeliveryReport()
+        payloads = await sync_to_async(triage)(
+            [row.as_payload() for row in rows], report
+        )
+        breaker = BatchBreaker(
+            self.breaker, await sync_to_async(self.breaker.is_open)()
+        )
+        await asyncio.gather(*(
+            self.deliver(payload, report, breaker) for payload in payloads
+        ))
+        await sync_to_async(breaker.flush)()
+        # outcome() записывает метрики в кеш: тоже не в цикле событий
+        outcome = await sync_to_async(report.outcome)()
+        await sync_to_async(settle_outbox_rows)(rows, outcome)
+        return len(rows)
+
+    async def run(self, once=False, idle_sleep=1.0):
+        """Разбирать очередь; с once=True — пока в ней есть готовые записи.
+
+        Возвращает число обработанных записей.
+        """
+        processed = 0
+        in_flight = set()
+
+        while True:
+            if len(in_flight) < self.pipeline_depth:
+                rows = await sync_to_async(lease_outbox_batch)(
+                    self.batch_size, self.lease
+                )
+                if rows:
+                    in_flight.add(asyncio.ensure_future(
+                        self.process_batch(rows)
+                    ))
+                    continue
+
+            if not in_flight:
+                if once:
+                    return processed
+                await asyncio.sleep(idle_sleep)
+                continue
+
+            done, in_flight = await asyncio.wait(
+                in_flight, return_when=asyncio.FIRST_COMPLETED
+            )
+            processed += sum(task.result() for task in done)
+
+
+async def run_async_sender(concurrency, batch_size, lease, once=False,
+                           idle_sleep=1.0):
+    async with AsyncExitStack() as stack:
+        bots = [
+            await stack.enter_async_context(bot)
+            for bot in build_bots(concurrency)
+        ]
+        sender = AsyncReminderSender(bots, concurrency, batch_size, lease)
+        return await sender.run(once=once, idle_sleep=idle_sleep)
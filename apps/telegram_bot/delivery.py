@@ -0,0 +1,188 @@
+import logging
+import random
+from django.conf import settings
+from django.utils import timezone
+from .metrics import MetricsRecorder, backlog_exceeded, observe_delivery
+from .models import ReminderDeadLetter
+from .sender import (
+    FAILED,
+    RETRY,
+    SENT,
+    is_unreachable_chat,
+    send_message,
+    telegram_breaker,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempt):
+    """Экспоненциальная задержка перед повтором, со случайным джиттером"""
+    delay = min(
+        settings.TELEGRAM_RETRY_BACKOFF * 2 ** (attempt - 1),
+        settings.TELEGRAM_RETRY_BACKOFF_MAX
+    )
+    return random.uniform(delay / 2, delay)
+
+
+def dead_letter(payload, error, chat_unreachable=False):
+    return ReminderDeadLetter(
+        chat_id=payload['chat_id'],
+        payload=payload,
+        error=error or '',
+        attempts=payload.get('attempt', 0) + 1,
+        chat_unreachable=chat_unreachable
+    )
+
+
+class DeliveryReport:
+    """Итоги отправки пачки заданий по политике повторов.
+
+    Временные ошибки повторяются с экспоненциальной задержкой (не раньше
+    retry_after из ответа 429), постоянные попадают в журнал
+    недоставленных. Задержки доставленных заданий по этапам
+    записываются в метрики.
+    """
+
+    def __init__(self):
+        self.recorder = MetricsRecorder()
+        self.late = 0
+        self.results = []
+        self.sent = []
+        self.dropped = []
+        self.failed = []  # временная ошибка, попытка засчитана
+        self.postponed = []  # не отправлялись, попытка не засчитана
+        self.dead_letters = []
+        self.retry_after = 0
+
+    def add(self, payload, status, error, started_at, acked_at):
+        if status == SENT:
+            self.sent.append(payload)
+            lag = observe_delivery(self.recorder, payload, started_at,
+                                   acked_at)
+            if lag is not None and lag > settings.REMINDER_LAG_SLO_SECONDS:
+                self.late += 1
+        self.results.append({
+            'habit_id': payload['habit_id'],
+            'chat_id': payload['chat_id'],
+            'status': status,
+            'error': error,
+        })
+
+        if status == RETRY:
+            self.failed.append((payload, error))
+        elif status == FAILED:
+            logger.warning('Failed to send message to %s: %s',
+                           payload['chat_id'], error)
+            self.dead_letters.append(
+                dead_letter(payload, error, is_unreachable_chat(error))
+            )
+
+    def drop(self, payload):
+        self.dropped.append(payload)
+
+    def postpone(self, payloads, retry_after):
+        self.postponed.extend(payloads)
+        self.retry_after = max(self.retry_after, retry_after)
+
+    def outcome(self):
+        """Словарь итогов:
+            results — результат по каждому отправленному заданию;
+            sent — доставленные задания;
+            dropped — задания, отброшенные при перегрузке;
+            retries — задания для повтора (с увеличенным attempt, если
+                      попытка засчитана);
+            countdown — через сколько секунд повторять;
+            dead_letters — несохранённые записи ReminderDeadLetter.
+        """
+        dead_letters = list(self.dead_letters)
+        retries = []
+        for payload, error in self.failed:
+            attempt = payload.get('attempt', 0) + 1
+            if attempt > settings.TELEGRAM_MAX_RETRIES:
+                dead_letters.append(dead_letter(payload, error))
+            else:
+                retries.append({**payload, 'attempt': attempt})
+        retries.extend(self.postponed)
+
+        self.recorder.finish('reminders_failed',
+                             [letter.payload for letter in dead_letters])
+        self.recorder.finish('reminders_dropped', self.dropped)
+        self.recorder.flush()
+        if self.late:
+            logger.warning('%d of %d reminders delivered later than %s s',
+                           self.late, len(self.results),
+                           settings.REMINDER_LAG_SLO_SECONDS)
+
+        countdown = 0
+        if retries:
+            attempt = max(payload.get('attempt', 0) for payload in retries)
+            countdown = max(self.retry_after,
+                            retry_delay(attempt) if attempt else 0)
+
+        return {
+            'results': self.results,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'retries': retries,
+            'countdown': countdown,
+            'dead_letters': dead_letters,
+        }
+
+
+def triage(payloads, report):
+    """Порядок отправки пачки с учётом перегрузки.
+
+    Пока очередь выше REMINDER_BACKLOG_THRESHOLD, задания старше
+    REMINDER_STALE_SECONDS отбрасываются (в report), а остальные
+    отправляются от самых свежих к старым.
+    """
+    if not backlog_exceeded():
+        return list(payloads)
+
+    threshold = timezone.now().timestamp() - settings.REMINDER_STALE_SECONDS
+    current = []
+    for payload in payloads:
+        scheduled_at = payload.get('scheduled_at')
+        if scheduled_at and scheduled_at < threshold:
+            report.drop(payload)
+        else:
+            current.append(payload)
+
+    if report.dropped:
+        logger.warning('Reminder backlog over %s: dropped %d stale reminders',
+                       settings.REMINDER_BACKLOG_THRESHOLD,
+                       len(report.dropped))
+    current.sort(key=lambda payload: payload.get('scheduled_at') or 0,
+                 reverse=True)
+    return current
+
+
+def deliver_payloads(payloads):
+    """Отправить задания по очереди, вернуть DeliveryReport.outcome().
+
+    Пока размыкатель разомкнут или действует лимит Bot API, оставшиеся
+    задания откладываются без отправки. При перегрузке см. triage.
+    """
+    breaker = telegram_breaker()
+    report = DeliveryReport()
+    payloads = triage(payloads, report)
+
+    for index, payload in enumerate(payloads):
+        if breaker.is_open():
+            report.postpone(payloads[index:], breaker.cooldown)
+            break
+
+        started_at = timezone.now().timestamp()
+        status, error, wait = send_message(payload['chat_id'],
+                                           payload['text'])
+        breaker.record(status != RETRY)
+        report.add(payload, status, error, started_at,
+                   timezone.now().timestamp())
+
+        if status == RETRY and wait:
+            # Лимит Bot API: остальные сообщения тоже подождут
+            report.postpone(payloads[index + 1:], wait)
+            break
+
+    return report.outcome()
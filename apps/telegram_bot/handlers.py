@@ -11,6 +11,7 @@ from telegram.ext import (
 )
 from django.contrib.auth import get_user_model
 from apps.habits.models import Habit
+from .models import ReminderDeadLetter
 from datetime import datetime
 from asgiref.sync import sync_to_async
 
@@ -34,6 +35,14 @@ def get_user_by_chat_id(chat_id):
     return User.objects.filter(telegram_chat_id=chat_id).first()
 
 
+@sync_to_async
+def forget_unreachable_chat(chat_id):
+    """Снова отправлять напоминания в чат, если пользователь вернулся"""
+    ReminderDeadLetter.objects.filter(
+        chat_id=chat_id, chat_unreachable=True
+    ).update(chat_unreachable=False)
+
+
 @sync_to_async
 def create_user(username, chat_id, password):
     """Создать нового пользователя"""
@@ -44,6 +53,14 @@ def create_user(username, chat_id, password):
     )
 
 
+@sync_to_async
+def toggle_reminder_digest(user):
+    """Включить или выключить режим сводки"""
+    user.reminder_digest = not user.reminder_digest
+    user.save(update_fields=['reminder_digest'])
+    return user.reminder_digest
+
+
 @sync_to_async
 def get_user_habits(user):
     """Получить привычки пользователя"""
@@ -89,6 +106,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = str(update.effective_chat.id)
 
     try:
+        # Пользователь написал боту, значит чат снова доступен
+        await forget_unreachable_chat(chat_id)
+
         # Ищем пользователя по Telegram Chat ID
         django_user = await get_user_by_chat_id(chat_id)
 
@@ -456,6 +476,35 @@ async def public_habits(update: Update,
         await update.message.reply_text("Произошла ошибка.")
 
 
+async def digest(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Переключить режим сводки"""
+    chat_id = str(update.effective_chat.id)
+
+    try:
+        user = await get_user_by_chat_id(chat_id)
+        if not user:
+            await update.message.reply_text(
+                "Вы не зарегистрированы. Используйте /start"
+            )
+            return
+
+        enabled = await toggle_reminder_digest(user)
+        if enabled:
+            message = (
+                "Режим сводки включен.\n"
+                "Одновременные напоминания придут одним сообщением, "
+                "а утром — список привычек на день."
+            )
+        else:
+            message = "Режим сводки выключен."
+
+        await update.message.reply_text(message)
+
+    except Exception as e:
+        logger.error(f"Error in digest: {e}")
+        await update.message.reply_text("Произошла ошибка.")
+
+
 async def help_command(update: Update,
                        context: ContextTypes.DEFAULT_TYPE) -> None:
     """Помощь"""
@@ -466,6 +515,7 @@ async def help_command(update: Update,
         "/create - Создать новую привычку\n"
         "/myhabits - Показать мои привычки\n"
         "/public - Показать публичные привычки\n"
+        "/digest - Включить или выключить режим сводки\n"
         "/help - Эта справка\n\n"
         "Пример создания привычки:\n"
         "1. /create\n"
@@ -511,4 +561,5 @@ def setup_handlers(application: Application) -> None:
     application.add_handler(conv_handler)
     application.add_handler(CommandHandler('myhabits', my_habits))
     application.add_handler(CommandHandler('public', public_habits))
+    application.add_handler(CommandHandler('digest', digest))
     application.add_handler(CommandHandler('help', help_command))
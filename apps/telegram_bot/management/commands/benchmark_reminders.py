@@ -0,0 +1,411 @@
+import collections
+import heapq
+import itertools
+import json
+import queue
+import resource
+import threading
+import time
+import uuid
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.utils import timezone
+from apps.habits.models import Habit
+from apps.telegram_bot import metrics
+from apps.telegram_bot.async_sender import run_async_sender
+from apps.telegram_bot.models import ReminderOutbox
+from apps.telegram_bot.outbox import drain_outbox_batch
+from apps.telegram_bot.tasks import (
+    scan_reminder_shard,
+    send_telegram_reminders_batch,
+)
+
+User = get_user_model()
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    """Имитация метода sendMessage Bot API"""
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело пишутся отдельно: без TCP_NODELAY каждый ответ
+    # ждал бы отложенного ACK клиента
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+
+        server = self.server
+        time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+            server.per_second[int(time.monotonic())] += 1
+            number = server.requests
+
+        if server.rate_limit_every and number % server.rate_limit_every == 0:
+            with server.lock:
+                server.rate_limited += 1
+            status = 429
+            body = {
+                'ok': False,
+                'error_code': 429,
+                'description': 'Too Many Requests: retry later',
+                'parameters': {'retry_after': server.retry_after},
+            }
+        elif self.path.endswith('/getMe'):
+            status = 200
+            body = {'ok': True, 'result': {
+                'id': 1, 'is_bot': True, 'first_name': 'Benchmark',
+                'username': 'benchmark_bot',
+            }}
+        else:
+            status = 200
+            body = {'ok': True, 'result': {
+                'message_id': number,
+                'date': int(time.time()),
+                'chat': {'id': number, 'type': 'private'},
+            }}
+
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Асинхронный отправитель открывает сотни соединений разом
+    request_queue_size = 1024
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест конвейера напоминаний '
+            'на локальной имитации Telegram API')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--habits', type=int, default=10000,
+                            help='Сколько привычек создать')
+        parser.add_argument('--users', type=int, default=2000,
+                            help='Сколько пользователей создать')
+        parser.add_argument('--due-ratio', type=float, default=1.0,
+                            help='Доля привычек, срабатывающих в эту минуту')
+        parser.add_argument('--shards', type=int, default=1,
+                            help='Число шардов проверки')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Напоминаний в одной задаче отправки')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Параллельных отправителей')
+        parser.add_argument('--latency-ms', type=float, default=20,
+                            help='Задержка ответа имитации API')
+        parser.add_argument('--rate-limit-every', type=int, default=0,
+                            help='Отвечать 429 на каждый N-й запрос')
+        parser.add_argument('--retry-after', type=int, default=1,
+                            help='retry_after в ответах 429')
+        parser.add_argument('--delivery',
+                            choices=['celery', 'outbox', 'async'],
+                            default='celery',
+                            help='Способ доставки напоминаний: задачи '
+                                 'Celery, очередь в базе или асинхронный '
+                                 'отправитель из очереди в базе')
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help='Одновременных отправок для --delivery async')
+        parser.add_argument('--spread-seconds', type=int, default=0,
+                            help='Окно распределения напоминаний минуты '
+                                 '(REMINDER_SPREAD_SECONDS)')
+        parser.add_argument('--keep', action='store_true',
+                            help='Не удалять созданные данные')
+
+    def handle(self, *args, **options):
+        now = timezone.now().replace(microsecond=0)
+        self.check_database_is_idle(now)
+
+        server = FakeTelegramServer(('127.0.0.1', 0), FakeTelegramHandler)
+        server.lock = threading.Lock()
+        server.requests = 0
+        server.per_second = collections.Counter()
+        server.rate_limited = 0
+        server.latency = options['latency_ms'] / 1000
+        server.rate_limit_every = options['rate_limit_every']
+        server.retry_after = options['retry_after']
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        prefix = f'bench_{uuid.uuid4().hex[:8]}'
+        # Асинхронный отправитель разбирает ту же очередь в базе
+        delivery = 'celery' if options['delivery'] == 'celery' else 'outbox'
+
+        try:
+            self.stdout.write('Создание данных...')
+            due_count = self.seed(prefix, now, options)
+
+            api_url = f'http://127.0.0.1:{server.server_address[1]}'
+            # Метрики прогона не смешиваются с метриками работающего
+            # конвейера и не переводят его в режим перегрузки
+            with override_settings(TELEGRAM_API_URL=api_url,
+                                   TELEGRAM_BOT_TOKEN='benchmark',
+                                   REMINDER_BATCH_SIZE=options['batch_size'],
+                                   REMINDER_DELIVERY=delivery,
+                                   REMINDER_SPREAD_SECONDS=options[
+                                       'spread_seconds'
+                                   ]), \
+                    mock.patch.object(metrics, 'PREFIX',
+                                      f'metrics:{prefix}'):
+                try:
+                    scan_time, slowest_shard, batches = self.run_scan(
+                        now, options['shards']
+                    )
+                    cpu_before = self.cpu_time()
+                    if delivery == 'outbox':
+                        enqueued = ReminderOutbox.objects.filter(
+                            habit__user__username__startswith=prefix
+                        ).count()
+                        if options['delivery'] == 'async':
+                            send_time, totals = self.run_async_sender(
+                                prefix, options['concurrency'],
+                                options['batch_size']
+                            )
+                        else:
+                            send_time, totals = self.run_outbox_senders(
+                                prefix, options['workers'], options['batch_size']
+                            )
+                    else:
+                        enqueued = sum(len(batch) for _, batch in batches)
+                        send_time, totals = self.run_senders(
+                            batches, options['workers']
+                        )
+                    send_cpu = self.cpu_time() - cpu_before
+                    lag = metrics.snapshot()['histograms']['reminder_total_lag']
+                finally:
+                    metrics.reset()
+        finally:
+            server.shutdown()
+            if not options['keep']:
+                User.objects.filter(username__startswith=prefix).delete()
+
+        self.stdout.write(self.style.SUCCESS('Результаты:'))
+        self.stdout.write(f'  Привычек: {options["habits"]}, '
+                          f'к отправке: {due_count}')
+        self.stdout.write(f'  Проверка: {scan_time:.3f} с '
+                          f'(самый долгий шард {slowest_shard:.3f} с)')
+        self.stdout.write(f'  Поставлено в очередь: {enqueued} '
+                          f'({enqueued / max(scan_time, 1e-9):.0f} в с)')
+        self.stdout.write(f'  Отправлено: {totals["sent"]} за '
+                          f'{send_time:.3f} с '
+                          f'({totals["sent"] / max(send_time, 1e-9):.1f} в с)')
+        self.stdout.write(f'  Процессорное время отправки: {send_cpu:.3f} с')
+        self.stdout.write(f'  Недоставлено: {totals["failed"]}, '
+                          f'повторов: {totals["retried"]}')
+        self.stdout.write(f'  Запросов к API: {server.requests}, '
+                          f'из них 429: {server.rate_limited}, '
+                          f'пик {max(server.per_second.values(), default=0)}'
+                          f' в с')
+        if lag['count']:
+            self.stdout.write('  Задержка доставки: ' + ', '.join(
+                f'p{int(quantile * 100)} ≤ '
+                f'{metrics.histogram_quantile(lag, quantile)} с'
+                for quantile in (0.5, 0.95, 0.99)
+            ))
+        # ru_maxrss в Linux измеряется в килобайтах
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(f'  Пиковая память процесса: '
+                          f'{peak_memory / 1024:.1f} МБ')
+
+        fits = scan_time + send_time <= 60
+        self.stdout.write(
+            f'  Укладывается в минуту beat: {"да" if fits else "нет"}'
+        )
+
+    def check_database_is_idle(self, now):
+        """Проверка и отправители берут все готовые записи, а не только
+        созданные прогоном: на базе с живыми напоминаниями они забрали бы
+        их и «доставили» имитации API"""
+        if Habit.objects.filter(next_fire_at__lte=now).exists():
+            raise CommandError(
+                'В базе есть привычки, ожидающие напоминания: запустите '
+                'нагрузочный тест на отдельной базе'
+            )
+        if ReminderOutbox.objects.filter(
+            status=ReminderOutbox.PENDING
+        ).exists():
+            raise CommandError(
+                'Очередь напоминаний в базе не пуста: запустите '
+                'нагрузочный тест на отдельной базе'
+            )
+
+    def cpu_time(self):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_utime + usage.ru_stime
+
+    def seed(self, prefix, now, options):
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=f'{prefix}_{i}',
+                    telegram_chat_id=str(10 ** 9 + i),
+                    password='!'
+                )
+                for i in range(options['users'])
+            ],
+            batch_size=1000
+        )
+        if not users[0].pk:
+            # Бэкенд не вернул первичные ключи из bulk_create
+            users = list(User.objects.filter(username__startswith=prefix))
+
+        due_count = int(options['habits'] * options['due_ratio'])
+        habits = []
+        for i in range(options['habits']):
+            due = i < due_count
+            next_fire_at = now if due else now + timedelta(days=1)
+            habits.append(Habit(
+                user=users[i % len(users)],
+                place='Дома',
+                time=now.time(),
+                action=f'Привычка {i}',
+                execution_time=60,
+                next_fire_at=next_fire_at
+            ))
+        Habit.objects.bulk_create(habits, batch_size=1000)
+        return due_count
+
+    def run_scan(self, now, shards):
+        batches = []
+
+        def collect(payloads):
+            batches.append((0, payloads))
+
+        def collect_delayed(args, countdown=0, **kwargs):
+            batches.append((countdown, args[0]))
+
+        shard_times = []
+        with mock.patch.object(send_telegram_reminders_batch, 'delay',
+                               collect), \
+                mock.patch.object(send_telegram_reminders_batch,
+                                  'apply_async', collect_delayed):
+            for shard in range(shards):
+                started = time.perf_counter()
+                scan_reminder_shard(now.isoformat(), shard, shards)
+                shard_times.append(time.perf_counter() - started)
+
+        return sum(shard_times), max(shard_times), batches
+
+    def run_senders(self, batches, workers):
+        pending = queue.Queue()
+        delayed = []
+        order = itertools.count()
+        lock = threading.Lock()
+        state = {'in_flight': 0}
+        totals = {'sent': 0, 'failed': 0, 'retried': 0}
+
+        def schedule(args, countdown=0, **kwargs):
+            with lock:
+                heapq.heappush(
+                    delayed,
+                    (time.monotonic() + countdown, next(order), args[0])
+                )
+
+        def worker():
+            while True:
+                batch = pending.get()
+                if batch is None:
+                    return
+                report = send_telegram_reminders_batch(batch)
+                with lock:
+                    for key in totals:
+                        totals[key] += report[key]
+                    state['in_flight'] -= 1
+
+        started = time.perf_counter()
+        with mock.patch.object(send_telegram_reminders_batch,
+                               'apply_async', schedule):
+            threads = [threading.Thread(target=worker)
+                       for _ in range(workers)]
+            for thread in threads:
+                thread.start()
+
+            for countdown, batch in batches:
+                schedule((batch,), countdown)
+
+            while True:
+                with lock:
+                    moment = time.monotonic()
+                    while delayed and delayed[0][0] <= moment:
+                        _, _, batch = heapq.heappop(delayed)
+                        state['in_flight'] += 1
+                        pending.put(batch)
+                    if not state['in_flight'] and not delayed:
+                        break
+                time.sleep(0.01)
+
+            for _ in threads:
+                pending.put(None)
+            for thread in threads:
+                thread.join()
+
+        return time.perf_counter() - started, totals
+
+    def run_outbox_senders(self, prefix, workers, batch_size):
+        pending = self.pending_outbox(prefix)
+        started = time.perf_counter()
+
+        def worker():
+            try:
+                while True:
+                    if drain_outbox_batch(batch_size):
+                        continue
+                    # Пусто: либо всё отправлено, либо ждём повторов
+                    if not pending.exists():
+                        return
+                    time.sleep(0.05)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return time.perf_counter() - started, self.outbox_totals(prefix)
+
+    def run_async_sender(self, prefix, concurrency, batch_size):
+        pending = self.pending_outbox(prefix)
+        started = time.perf_counter()
+        while pending.exists():
+            async_to_sync(run_async_sender)(concurrency, batch_size,
+                                            lease=60, once=True)
+            # Остались только отложенные повторы
+            time.sleep(0.05)
+        return time.perf_counter() - started, self.outbox_totals(prefix)
+
+    def pending_outbox(self, prefix):
+        return ReminderOutbox.objects.filter(
+            status=ReminderOutbox.PENDING,
+            habit__user__username__startswith=prefix
+        )
+
+    def outbox_totals(self, prefix):
+        rows = ReminderOutbox.objects.filter(
+            habit__user__username__startswith=prefix
+        )
+        counts = dict(
+            rows
+            .values_list('status')
+            .annotate(count=Count('id'))
+        )
+        totals = {
+            'sent': counts.get(ReminderOutbox.SENT, 0),
+            'failed': counts.get(ReminderOutbox.FAILED, 0),
+            'retried': rows.filter(attempts__gt=0).count(),
+        }
+        return totals
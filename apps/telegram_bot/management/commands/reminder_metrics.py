@@ -0,0 +1,78 @@
+import json
+from django.core.management.base import BaseCommand
+from apps.telegram_bot import metrics
+
+
+class Command(BaseCommand):
+    help = 'Метрики задержки доставки напоминаний'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=['text', 'json', 'prometheus'],
+                            default='text',
+                            help='Формат вывода')
+        parser.add_argument('--reset', action='store_true',
+                            help='Обнулить метрики после вывода')
+
+    def handle(self, *args, **options):
+        data = metrics.snapshot()
+
+        if options['output'] == 'json':
+            self.stdout.write(json.dumps(data, indent=2))
+        elif options['output'] == 'prometheus':
+            self.stdout.write(self.prometheus(data))
+        else:
+            self.text(data)
+
+        if options['reset']:
+            metrics.reset()
+
+    def text(self, data):
+        self.stdout.write(f'Невыполненных напоминаний: {data["backlog"]}')
+        for name, title in metrics.COUNTERS.items():
+            self.stdout.write(f'{title}: {data["counters"][name]}')
+
+        for name, title in metrics.HISTOGRAMS.items():
+            histogram = data['histograms'][name]
+            if not histogram['count']:
+                self.stdout.write(f'{title}: нет данных')
+                continue
+
+            average = histogram['sum'] / histogram['count']
+            quantiles = ', '.join(
+                f'p{int(quantile * 100)} ≤ '
+                f'{metrics.histogram_quantile(histogram, quantile)} с'
+                for quantile in (0.5, 0.95, 0.99)
+            )
+            self.stdout.write(f'{title}: в среднем {average:.2f} с, '
+                              f'{quantiles}')
+
+    def prometheus(self, data):
+        lines = [
+            '# HELP reminder_backlog Напоминания в очереди на отправку',
+            '# TYPE reminder_backlog gauge',
+            f'reminder_backlog {data["backlog"]}',
+        ]
+
+        for name, title in metrics.COUNTERS.items():
+            lines += [
+                f'# HELP {name}_total {title}',
+                f'# TYPE {name}_total counter',
+                f'{name}_total {data["counters"][name]}',
+            ]
+
+        for name, title in metrics.HISTOGRAMS.items():
+            histogram = data['histograms'][name]
+            metric = f'{name}_seconds'
+            lines += [
+                f'# HELP {metric} {title}',
+                f'# TYPE {metric} histogram',
+            ]
+            for bound, count in histogram['buckets'].items():
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {count}')
+            lines += [
+                f'{metric}_bucket{{le="+Inf"}} {histogram["count"]}',
+                f'{metric}_sum {histogram["sum"]}',
+                f'{metric}_count {histogram["count"]}',
+            ]
+
+        return '\n'.join(lines)
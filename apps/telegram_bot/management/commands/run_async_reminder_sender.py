@@ -0,0 +1,42 @@
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from apps.telegram_bot.async_sender import run_async_sender
+
+
+class Command(BaseCommand):
+    help = ('Асинхронный отправитель напоминаний из очереди в базе: '
+            'сотни сообщений одновременно в одном процессе')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help='Сколько сообщений отправлять одновременно')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Записей, захватываемых за один раз')
+        parser.add_argument('--lease', type=int, default=300,
+                            help='На сколько секунд захватывать записи')
+        parser.add_argument('--idle-sleep', type=float, default=1.0,
+                            help='Пауза (в секундах), когда очередь пуста')
+        parser.add_argument('--once', action='store_true',
+                            help='Разобрать очередь и завершиться')
+
+    def handle(self, *args, **options):
+        if not settings.TELEGRAM_BOT_TOKEN:
+            self.stderr.write('TELEGRAM_BOT_TOKEN не задан')
+            return
+
+        if not connection.features.has_select_for_update_skip_locked:
+            self.stdout.write(self.style.WARNING(
+                'База не поддерживает SKIP LOCKED: '
+                'запускайте только один отправитель'
+            ))
+
+        processed = async_to_sync(run_async_sender)(
+            options['concurrency'],
+            options['batch_size'],
+            options['lease'],
+            once=options['once'],
+            idle_sleep=options['idle_sleep']
+        )
+        self.stdout.write(f'Обработано напоминаний: {processed}')
@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from apps.telegram_bot.outbox import drain_outbox_batch
+
+
+class Command(BaseCommand):
+    help = ('Отправитель напоминаний из очереди в базе. '
+            'В PostgreSQL можно запускать несколько процессов одновременно')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Записей, захватываемых за одну транзакцию')
+        parser.add_argument('--idle-sleep', type=float, default=1.0,
+                            help='Пауза (в секундах), когда очередь пуста')
+        parser.add_argument('--once', action='store_true',
+                            help='Разобрать очередь и завершиться')
+
+    def handle(self, *args, **options):
+        if not connection.features.has_select_for_update_skip_locked:
+            self.stdout.write(self.style.WARNING(
+                'База не поддерживает SKIP LOCKED: '
+                'запускайте только один отправитель'
+            ))
+
+        processed = 0
+        while True:
+            count = drain_outbox_batch(options['batch_size'])
+            processed += count
+            if count:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['idle_sleep'])
+
+        self.stdout.write(f'Обработано напоминаний: {processed}')
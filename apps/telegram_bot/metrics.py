@@ -0,0 +1,218 @@
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+# Границы корзин гистограмм задержки, в секундах
+LAG_BUCKETS = (1, 2, 5, 10, 30, 60, 120, 300, 600)
+
+# Задержки конвейера напоминаний по этапам:
+# запланировано -> найдено проверкой -> поставлено в очередь ->
+# взято отправителем -> подтверждено Telegram
+HISTOGRAMS = {
+    'reminder_scan_lag': 'От запланированного времени до проверки',
+    'reminder_enqueue_lag': 'От проверки до постановки в очередь',
+    'reminder_queue_wait': 'Ожидание в очереди до отправителя',
+    'reminder_send_time': 'Запрос к Telegram до подтверждения',
+    'reminder_total_lag': 'От запланированного времени до доставки',
+}
+
+COUNTERS = {
+    'reminders_enqueued': 'Поставлено в очередь',
+    'reminders_sent': 'Доставлено',
+    'reminders_failed': 'Не доставлено',
+    'reminders_late': 'Доставлено позже REMINDER_LAG_SLO_SECONDS',
+    'reminders_dropped': 'Отброшено при перегрузке',
+}
+
+# Счётчики хранятся в общем кеше без срока жизни
+PREFIX = 'metrics:reminders'
+
+# Очередь оценивается по корзинам в BACKLOG_BUCKET секунд за последние
+# REMINDER_BACKLOG_WINDOW_SECONDS: задание считается в корзине времени
+# постановки (enqueued_at) и при завершении вычитается из неё же. Корзина
+# выпадает из оценки вместе со своими потерянными заданиями (упавший
+# воркер, очищенный брокер), не задевая поставленные позже
+BACKLOG_BUCKET = 60
+
+
+def _incr(key, amount, timeout=None):
+    cache.add(key, 0, timeout)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.set(key, amount, timeout)
+
+
+def _backlog_bucket(timestamp):
+    return int(timestamp // BACKLOG_BUCKET)
+
+
+def _backlog_buckets():
+    current = _backlog_bucket(timezone.now().timestamp())
+    count = max(settings.REMINDER_BACKLOG_WINDOW_SECONDS // BACKLOG_BUCKET, 1)
+    return range(current - count + 1, current + 1)
+
+
+class MetricsRecorder:
+    """Накопление замеров в процессе с одной записью в кеш на пачку"""
+
+    def __init__(self):
+        self.counts = Counter()
+        # Поставленные и завершённые задания по корзинам очереди
+        self.enqueued = Counter()
+        self.finished = Counter()
+
+    def observe(self, name, seconds):
+        seconds = max(seconds, 0)
+        for bound in LAG_BUCKETS:
+            if seconds <= bound:
+                self.counts[f'{name}:le:{bound}'] += 1
+        self.counts[f'{name}:count'] += 1
+        self.counts[f'{name}:sum_ms'] += int(seconds * 1000)
+
+    def incr(self, name, amount=1):
+        self.counts[name] += amount
+
+    def enqueue(self, count, enqueued_at):
+        self.counts['reminders_enqueued'] += count
+        self.enqueued[_backlog_bucket(enqueued_at)] += count
+
+    def finish(self, name, payloads):
+        """Учесть завершённые задания в счётчике name и в корзинах очереди,
+        куда они были поставлены"""
+        now = timezone.now().timestamp()
+        for payload in payloads:
+            self.counts[name] += 1
+            enqueued_at = payload.get('enqueued_at') or now
+            self.finished[_backlog_bucket(enqueued_at)] += 1
+
+    def flush(self):
+        for key, amount in self.counts.items():
+            if amount:
+                _incr(f'{PREFIX}:{key}', amount)
+
+        window = _backlog_buckets()
+        timeout = settings.REMINDER_BACKLOG_WINDOW_SECONDS + BACKLOG_BUCKET
+        for kind, buckets in (('enqueued', self.enqueued),
+                              ('finished', self.finished)):
+            for bucket, amount in buckets.items():
+                # Корзины старше окна уже не учитываются
+                if bucket in window:
+                    _incr(f'{PREFIX}:backlog:{bucket}:{kind}', amount,
+                          timeout)
+
+        self.counts.clear()
+        self.enqueued.clear()
+        self.finished.clear()
+
+
+def record_enqueued(count, enqueued_at=None):
+    if enqueued_at is None:
+        enqueued_at = timezone.now().timestamp()
+    recorder = MetricsRecorder()
+    recorder.enqueue(count, enqueued_at)
+    recorder.flush()
+
+
+def observe_delivery(recorder, payload, started_at, acked_at):
+    """Замерить этапы доставленного напоминания по меткам в задании.
+
+    Возвращает полную задержку доставки в секундах, если она известна.
+    """
+    scheduled_at = payload.get('scheduled_at')
+    scanned_at = payload.get('scanned_at')
+    enqueued_at = payload.get('enqueued_at')
+
+    if scheduled_at and scanned_at:
+        recorder.observe('reminder_scan_lag', scanned_at - scheduled_at)
+    if scanned_at and enqueued_at:
+        recorder.observe('reminder_enqueue_lag', enqueued_at - scanned_at)
+    if enqueued_at:
+        # Сдвиг из REMINDER_SPREAD_SECONDS — не ожидание в очереди
+        ready_at = max(enqueued_at, payload.get('send_at') or 0)
+        recorder.observe('reminder_queue_wait', started_at - ready_at)
+    recorder.observe('reminder_send_time', acked_at - started_at)
+    recorder.finish('reminders_sent', [payload])
+    if not scheduled_at:
+        return None
+
+    total_lag = acked_at - scheduled_at
+    recorder.observe('reminder_total_lag', total_lag)
+    if total_lag > settings.REMINDER_LAG_SLO_SECONDS:
+        recorder.incr('reminders_late')
+    return total_lag
+
+
+def reminder_backlog():
+    """Сколько напоминаний поставлено, но ещё не доставлено и не отброшено"""
+    if settings.REMINDER_DELIVERY == 'outbox':
+        from .models import ReminderOutbox
+        return ReminderOutbox.objects.filter(
+            status=ReminderOutbox.PENDING
+        ).count()
+
+    keys = {
+        bucket: (f'{PREFIX}:backlog:{bucket}:enqueued',
+                 f'{PREFIX}:backlog:{bucket}:finished')
+        for bucket in _backlog_buckets()
+    }
+    values = cache.get_many([key for pair in keys.values() for key in pair])
+    enqueued = sum(values.get(key, 0) for key, _ in keys.values())
+    finished = sum(values.get(key, 0) for _, key in keys.values())
+    return max(enqueued - finished, 0)
+
+
+def backlog_exceeded():
+    """Очередь выросла выше REMINDER_BACKLOG_THRESHOLD: пора деградировать"""
+    return reminder_backlog() > settings.REMINDER_BACKLOG_THRESHOLD
+
+
+def histogram_quantile(histogram, quantile):
+    """Верхняя граница корзины, в которую попадает квантиль"""
+    if not histogram['count']:
+        return None
+    rank = quantile * histogram['count']
+    for bound in LAG_BUCKETS:
+        if histogram['buckets'][bound] >= rank:
+            return bound
+    return float('inf')
+
+
+def snapshot():
+    """Текущие значения всех метрик"""
+    keys = [f'{PREFIX}:{name}' for name in COUNTERS]
+    for name in HISTOGRAMS:
+        keys += [f'{PREFIX}:{name}:le:{bound}' for bound in LAG_BUCKETS]
+        keys += [f'{PREFIX}:{name}:count', f'{PREFIX}:{name}:sum_ms']
+    values = cache.get_many(keys)
+
+    histograms = {}
+    for name in HISTOGRAMS:
+        histograms[name] = {
+            'buckets': {
+                bound: values.get(f'{PREFIX}:{name}:le:{bound}', 0)
+                for bound in LAG_BUCKETS
+            },
+            'count': values.get(f'{PREFIX}:{name}:count', 0),
+            'sum': values.get(f'{PREFIX}:{name}:sum_ms', 0) / 1000,
+        }
+
+    return {
+        'counters': {
+            name: values.get(f'{PREFIX}:{name}', 0) for name in COUNTERS
+        },
+        'histograms': histograms,
+        'backlog': reminder_backlog(),
+    }
+
+
+def reset():
+    keys = [f'{PREFIX}:{name}' for name in COUNTERS]
+    for name in HISTOGRAMS:
+        keys += [f'{PREFIX}:{name}:le:{bound}' for bound in LAG_BUCKETS]
+        keys += [f'{PREFIX}:{name}:count', f'{PREFIX}:{name}:sum_ms']
+    for bucket in _backlog_buckets():
+        keys += [f'{PREFIX}:backlog:{bucket}:enqueued',
+                 f'{PREFIX}:backlog:{bucket}:finished']
+    cache.delete_many(keys)
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('habits', '0003_habit_minute_of_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderDispatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occurrence', models.DateTimeField(help_text='Запланированное время напоминания', verbose_name='Срабатывание')),
+                ('claim_token', models.UUIDField(db_index=True, help_text='Идентификатор проверки, которая захватила напоминание', verbose_name='Токен захвата')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('habit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminder_dispatches', to='habits.habit', verbose_name='Привычка')),
+            ],
+            options={
+                'verbose_name': 'Отправка напоминания',
+                'verbose_name_plural': 'Отправки напоминаний',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reminderdispatch',
+            constraint=models.UniqueConstraint(fields=('habit', 'occurrence'), name='unique_reminder_dispatch'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram_bot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderDeadLetter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(db_index=True, max_length=100, verbose_name='Telegram Chat ID')),
+                ('payload', models.JSONField(verbose_name='Задание на отправку')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('attempts', models.PositiveIntegerField(default=1, verbose_name='Попыток')),
+                ('chat_unreachable', models.BooleanField(default=False, help_text='Бот заблокирован или чат не найден: напоминания в этот чат больше не ставятся', verbose_name='Чат недоступен')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Недоставленное напоминание',
+                'verbose_name_plural': 'Недоставленные напоминания',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
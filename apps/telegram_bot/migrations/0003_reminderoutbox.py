@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0004_habit_next_fire_at'),
+        ('telegram_bot', '0002_reminderdeadletter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(max_length=100, verbose_name='Telegram Chat ID')),
+                ('text', models.TextField(verbose_name='Текст напоминания')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает отправки'), ('sent', 'Отправлено'), ('failed', 'Не доставлено')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('available_at', models.DateTimeField(verbose_name='Отправить не раньше')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('habit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_reminders', to='habits.habit', verbose_name='Привычка')),
+            ],
+            options={
+                'verbose_name': 'Напоминание в очереди',
+                'verbose_name_plural': 'Очередь напоминаний',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['available_at', 'id'], name='reminder_outbox_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram_bot', '0003_reminderoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MorningSummaryDispatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата (по местному времени)')),
+                ('claim_token', models.UUIDField(db_index=True, verbose_name='Токен захвата')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='morning_summaries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Утренняя сводка',
+                'verbose_name_plural': 'Утренние сводки',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='morningsummarydispatch',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_morning_summary'),
+        ),
+    ]
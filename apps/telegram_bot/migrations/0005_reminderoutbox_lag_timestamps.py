@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram_bot', '0004_morningsummarydispatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminderoutbox',
+            name='scanned_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Найдено проверкой'),
+        ),
+        migrations.AddField(
+            model_name='reminderoutbox',
+            name='scheduled_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Запланировано на'),
+        ),
+    ]
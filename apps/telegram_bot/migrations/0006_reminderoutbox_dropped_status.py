@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram_bot', '0005_reminderoutbox_lag_timestamps'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reminderoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает отправки'), ('sent', 'Отправлено'), ('failed', 'Не доставлено'), ('dropped', 'Отброшено при перегрузке')], default='pending', max_length=10, verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,177 @@
+from django.conf import settings
+from django.db import models
+from apps.habits.models import Habit
+
+
+class ReminderDispatch(models.Model):
+    """Журнал отправленных напоминаний: одна запись на одно срабатывание"""
+    habit = models.ForeignKey(
+        Habit,
+        on_delete=models.CASCADE,
+        related_name='reminder_dispatches',
+        verbose_name='Привычка'
+    )
+    occurrence = models.DateTimeField(
+        verbose_name='Срабатывание',
+        help_text='Запланированное время напоминания'
+    )
+    claim_token = models.UUIDField(
+        db_index=True,
+        verbose_name='Токен захвата',
+        help_text='Идентификатор проверки, которая захватила напоминание'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Отправка напоминания'
+        verbose_name_plural = 'Отправки напоминаний'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['habit', 'occurrence'],
+                name='unique_reminder_dispatch'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.habit_id} @ {self.occurrence}"
+
+
+class MorningSummaryDispatch(models.Model):
+    """Журнал утренних сводок: одна запись на пользователя в день"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='morning_summaries',
+        verbose_name='Пользователь'
+    )
+    date = models.DateField(verbose_name='Дата (по местному времени)')
+    claim_token = models.UUIDField(
+        db_index=True,
+        verbose_name='Токен захвата'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Утренняя сводка'
+        verbose_name_plural = 'Утренние сводки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'date'],
+                name='unique_morning_summary'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.date}"
+
+
+class ReminderDeadLetter(models.Model):
+    """Напоминание, которое не удалось доставить"""
+    chat_id = models.CharField(
+        max_length=100,
+        db_index=True,
+        verbose_name='Telegram Chat ID'
+    )
+    payload = models.JSONField(verbose_name='Задание на отправку')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    attempts = models.PositiveIntegerField(
+        default=1,
+        verbose_name='Попыток'
+    )
+    chat_unreachable = models.BooleanField(
+        default=False,
+        verbose_name='Чат недоступен',
+        help_text='Бот заблокирован или чат не найден: '
+                  'напоминания в этот чат больше не ставятся'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Недоставленное напоминание'
+        verbose_name_plural = 'Недоставленные напоминания'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.chat_id}: {self.error[:50]}"
+
+
+class ReminderOutbox(models.Model):
+    """Очередь напоминаний в базе: заполняется проверкой в одной
+    транзакции с журналом отправок и разбирается отправителями"""
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    DROPPED = 'dropped'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Ожидает отправки'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Не доставлено'),
+        (DROPPED, 'Отброшено при перегрузке'),
+    ]
+
+    habit = models.ForeignKey(
+        Habit,
+        on_delete=models.CASCADE,
+        related_name='outbox_reminders',
+        verbose_name='Привычка'
+    )
+    chat_id = models.CharField(
+        max_length=100,
+        verbose_name='Telegram Chat ID'
+    )
+    text = models.TextField(verbose_name='Текст напоминания')
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name='Статус'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    available_at = models.DateTimeField(
+        verbose_name='Отправить не раньше'
+    )
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    scheduled_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Запланировано на'
+    )
+    scanned_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Найдено проверкой'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Напоминание в очереди'
+        verbose_name_plural = 'Очередь напоминаний'
+        indexes = [
+            models.Index(
+                fields=['available_at', 'id'],
+                condition=models.Q(status='pending'),
+                name='reminder_outbox_pending_idx'
+            ),
+        ]
+
+    def as_payload(self):
+        return {
+            'outbox_id': self.id,
+            'habit_id': self.habit_id,
+            'chat_id': self.chat_id,
+            'text': self.text,
+            'attempt': self.attempts,
+            'scheduled_at': (self.scheduled_at.timestamp()
+                             if self.scheduled_at else None),
+            'scanned_at': (self.scanned_at.timestamp()
+                           if self.scanned_at else None),
+            'enqueued_at': self.created_at.timestamp(),
+        }
+
+    def __str__(self):
+        return f"{self.chat_id} [{self.status}]"
@@ -0,0 +1,95 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .delivery import deliver_payloads
+from .models import ReminderDeadLetter, ReminderOutbox
+
+
+def pending_reminders(now):
+    """Готовые к отправке записи очереди, заблокированные для этой
+    транзакции.
+
+    В PostgreSQL строки захватываются через SELECT ... FOR UPDATE
+    SKIP LOCKED, поэтому несколько отправителей разбирают очередь
+    параллельно, не мешая друг другу. SQLite блокировок строк не
+    поддерживает: там очередь должен разбирать один процесс.
+    """
+    queryset = (
+        ReminderOutbox.objects
+        .filter(status=ReminderOutbox.PENDING, available_at__lte=now)
+        .order_by('available_at', 'id')
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        queryset = queryset.select_for_update(skip_locked=True)
+    return queryset
+
+
+def drain_outbox_batch(batch_size, lease=None):
+    """Отправить одну пачку из очереди, вернуть число обработанных записей.
+
+    Записи берутся в аренду (см. lease_outbox_batch), отправляются вне
+    транзакции, а итоги записываются отдельной короткой транзакцией.
+    """
+    if lease is None:
+        lease = settings.REMINDER_OUTBOX_LEASE_SECONDS
+
+    rows = lease_outbox_batch(batch_size, lease)
+    if not rows:
+        return 0
+
+    outcome = deliver_payloads([row.as_payload() for row in rows])
+    with transaction.atomic():
+        settle_outbox_rows(rows, outcome)
+
+    return len(rows)
+
+
+def lease_outbox_batch(batch_size, lease):
+    """Захватить пачку записей очереди на lease секунд, не держа блокировку.
+
+    Для отправителей, которые не могут держать транзакцию открытой на
+    время отправки: захваченные записи откладываются на время аренды, и
+    если отправитель упадёт, их заберёт другой. Возвращает записи.
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        rows = list(pending_reminders(now)[:batch_size])
+        ReminderOutbox.objects.filter(
+            id__in=[row.id for row in rows]
+        ).update(available_at=now + timedelta(seconds=lease))
+
+    return rows
+
+
+def settle_outbox_rows(rows, outcome):
+    """Записать в очередь итоги отправки пачки (см. DeliveryReport)"""
+    rows_by_id = {row.id: row for row in rows}
+    done = timezone.now()
+
+    for payload in outcome['sent']:
+        row = rows_by_id[payload['outbox_id']]
+        row.status = ReminderOutbox.SENT
+        row.sent_at = done
+
+    for payload in outcome['dropped']:
+        rows_by_id[payload['outbox_id']].status = ReminderOutbox.DROPPED
+
+    retry_at = done + timedelta(seconds=outcome['countdown'])
+    for payload in outcome['retries']:
+        row = rows_by_id[payload['outbox_id']]
+        row.attempts = payload.get('attempt', 0)
+        row.available_at = retry_at
+
+    for letter in outcome['dead_letters']:
+        row = rows_by_id[letter.payload['outbox_id']]
+        row.status = ReminderOutbox.FAILED
+        row.attempts = letter.attempts
+        row.error = letter.error
+
+    ReminderOutbox.objects.bulk_update(
+        rows, ['status', 'attempts', 'available_at', 'error', 'sent_at']
+    )
+    if outcome['dead_letters']:
+        ReminderDeadLetter.objects.bulk_create(outcome['dead_letters'])
@@ -0,0 +1,65 @@
+from html import escape
+
+
+def build_reminder_message(habit):
+    """Текст напоминания о привычке"""
+    return f"🔔 Напоминание о привычке!\n\n" \
+           f"Привычка: {escape(habit.action)}\n" \
+           f"Время: {habit.time}\n" \
+           f"Место: {escape(habit.place)}\n" \
+           f"Время на выполнение: {habit.execution_time} сек."
+
+
+def build_habit_line(habit):
+    return f"• {habit.time:%H:%M} — {escape(habit.action)} " \
+           f"({escape(habit.place)}, {habit.execution_time} сек.)"
+
+
+def build_digest_message(habits):
+    """Одно напоминание о нескольких привычках"""
+    lines = '\n'.join(build_habit_line(habit) for habit in habits)
+    return f"🔔 Напоминание о привычках!\n\n{lines}"
+
+
+def build_summary_message(habits):
+    """Утренняя сводка привычек на день"""
+    lines = '\n'.join(build_habit_line(habit) for habit in habits)
+    return f"☀️ Доброе утро! Привычки на сегодня:\n\n{lines}"
+
+
+def build_payload(habits, text):
+    """Самодостаточное задание на отправку: воркеру не нужна база"""
+    return {
+        'habit_id': habits[0].id,
+        'habit_ids': [habit.id for habit in habits],
+        'chat_id': habits[0].user.telegram_chat_id,
+        'text': text,
+    }
+
+
+def build_reminder_payloads(habits, merge_all=False):
+    """Задания на отправку напоминаний.
+
+    Привычки пользователей в режиме сводки (или всех пользователей при
+    merge_all), сработавшие одновременно, объединяются в одно сообщение
+    на чат.
+    """
+    payloads = []
+    digests = {}
+    for habit in habits:
+        if merge_all or habit.user.reminder_digest:
+            digests.setdefault(habit.user.telegram_chat_id, []).append(habit)
+        else:
+            payloads.append(
+                build_payload([habit], build_reminder_message(habit))
+            )
+
+    for chat_habits in digests.values():
+        if len(chat_habits) == 1:
+            text = build_reminder_message(chat_habits[0])
+        else:
+            chat_habits.sort(key=lambda habit: (habit.time, habit.id))
+            text = build_digest_message(chat_habits)
+        payloads.append(build_payload(chat_habits, text))
+
+    return payloads
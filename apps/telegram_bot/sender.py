@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+
+# Результаты отправки сообщения
+SENT = 'sent'
+RETRY = 'retry'  # временная ошибка: 429, 5xx, сеть
+FAILED = 'failed'  # постоянная ошибка: повтор не поможет
+
+# Ответы Bot API, после которых писать в чат бессмысленно
+UNREACHABLE_CHAT_ERRORS = (
+    'chat not found',
+    'bot was blocked by the user',
+    'user is deactivated',
+    'bot was kicked',
+    'bot is not a member',
+)
+
+# Сессия создаётся лениво в каждом процессе (и потоке) воркера:
+# prefork-воркеры Celery не должны делить соединения, открытые
+# в родительском процессе
+_local = threading.local()
+
+
+def get_session():
+    """HTTP-сессия с keep-alive, одна на процесс воркера"""
+    if getattr(_local, 'pid', None) != os.getpid():
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _local.session = session
+        _local.pid = os.getpid()
+
+    return _local.session
+
+
+def is_unreachable_chat(error):
+    """Ошибка означает, что чат больше не принимает сообщения бота"""
+    error = (error or '').lower()
+    return any(marker in error for marker in UNREACHABLE_CHAT_ERRORS)
+
+
+def send_message(chat_id, text):
+    """Отправить сообщение в чат.
+
+    Возвращает (результат, текст ошибки, retry_after в секундах).
+    """
+    bot_token = settings.TELEGRAM_BOT_TOKEN
+    if not bot_token:
+        return FAILED, 'TELEGRAM_BOT_TOKEN not set', None
+
+    url = f"{settings.TELEGRAM_API_URL}/bot{bot_token}/sendMessage"
+    payload = {
+        'chat_id': chat_id,
+        'text': text,
+        'parse_mode': 'HTML'
+    }
+
+    try:
+        response = get_session().post(
+            url, json=payload, timeout=settings.TELEGRAM_REQUEST_TIMEOUT
+        )
+    except requests.RequestException as e:
+        return RETRY, str(e), None
+
+    if response.status_code == 200:
+        return SENT, None, None
+
+    if response.status_code == 429:
+        try:
+            parameters = response.json().get('parameters') or {}
+        except ValueError:
+            parameters = {}
+        return RETRY, response.text, parameters.get('retry_after')
+
+    if response.status_code >= 500:
+        return RETRY, response.text, None
+
+    return FAILED, response.text, None
+
+
+class CircuitBreaker:
+    """Размыкатель цепи на общем кеше.
+
+    Считает запросы и временные ошибки в окне window секунд; если доля
+    ошибок превышает error_rate (при не менее min_calls запросах),
+    размыкается на cooldown секунд, и отправка приостанавливается.
+    """
+
+    def __init__(self, name, error_rate, min_calls, window, cooldown):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+
+    @property
+    def open_key(self):
+        return f'breaker:{self.name}:open'
+
+    def is_open(self):
+        return cache.get(self.open_key) is not None
+
+    def _incr(self, key, amount):
+        cache.add(key, 0, self.window * 2)
+        try:
+            return cache.incr(key, amount)
+        except ValueError:
+            # Ключ успел истечь между add и incr
+            cache.set(key, amount, self.window * 2)
+            return amount
+
+    def record(self, success):
+        self.record_many(1, 0 if success else 1)
+
+    def record_many(self, calls, errors):
+        """Учесть сразу несколько запросов, из них errors неудачных"""
+        if not calls:
+            return
+        bucket = int(time.time() // self.window)
+        prefix = f'breaker:{self.name}:{bucket}'
+
+        calls = self._incr(f'{prefix}:calls', calls)
+        if not errors:
+            return
+        errors = self._incr(f'{prefix}:errors', errors)
+
+        if calls >= self.min_calls and errors / calls >= self.error_rate:
+            cache.set(self.open_key, 1, self.cooldown)
+
+
+class BatchBreaker:
+    """Состояние размыкателя на время одной пачки.
+
+    Общий кеш читается один раз в начале пачки и пополняется один раз в
+    конце (flush), а внутри пачки запросы и ошибки считаются в памяти:
+    асинхронному отправителю нельзя ходить в кеш из цикла событий.
+    """
+
+    def __init__(self, breaker, is_open):
+        self.breaker = breaker
+        self.open = is_open
+        self.calls = 0
+        self.errors = 0
+
+    @property
+    def cooldown(self):
+        return self.breaker.cooldown
+
+    def is_open(self):
+        return self.open
+
+    def record(self, success):
+        self.calls += 1
+        if success:
+            return
+        self.errors += 1
+        if (self.calls >= self.breaker.min_calls
+                and self.errors / self.calls >= self.breaker.error_rate):
+            self.open = True
+
+    def flush(self):
+        self.breaker.record_many(self.calls, self.errors)
+
+
+def telegram_breaker():
+    return CircuitBreaker(
+        'telegram',
+        error_rate=settings.TELEGRAM_BREAKER_ERROR_RATE,
+        min_calls=settings.TELEGRAM_BREAKER_MIN_CALLS,
+        window=settings.TELEGRAM_BREAKER_WINDOW,
+        cooldown=settings.TELEGRAM_BREAKER_COOLDOWN,
+    )
@@ -1,76 +1,444 @@
-import os
-import requests
-from celery import shared_task
-from apps.habits.models import Habit
+import logging
+import time
+import uuid
+import zlib
+from datetime import datetime, time as time_of_day, timedelta
+from zoneinfo import ZoneInfo
+from celery import group, shared_task
+from django.conf import settings
+from django.db import connection, transaction
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils import timezone
+from apps.habits.models import REMINDER_SLOTS, Habit
+from .delivery import deliver_payloads
+from .metrics import backlog_exceeded, record_enqueued
+from .models import (
+    MorningSummaryDispatch,
+    ReminderDeadLetter,
+    ReminderDispatch,
+    ReminderOutbox,
+)
+from .outbox import drain_outbox_batch
+from .reminders import (
+    build_payload,
+    build_reminder_payloads,
+    build_summary_message,
+)
+from .sender import SENT
 
+User = get_user_model()
+logger = logging.getLogger(__name__)
 
-@shared_task
-def send_telegram_reminder(habit_id):
-    try:
-        habit = Habit.objects.get(id=habit_id)
-        user = habit.user
+# Приоритет повторных отправок: ниже маршрута очереди reminders_send
+# (см. config/celery.py), чтобы повторы уступали свежим напоминаниям
+REMINDER_RETRY_PRIORITY = 6
+# Приоритет свежих напоминаний при перегрузке: выше накопившихся
+REMINDER_FRESH_PRIORITY = 2
 
-        if not user.telegram_chat_id:
-            print(f"User {user.username} has no Telegram chat ID")
-            return
 
-        message = f"🔔 Напоминание о привычке!\n\n" \
-                  f"Привычка: {habit.action}\n" \
-                  f"Время: {habit.time}\n" \
-                  f"Место: {habit.place}\n" \
-                  f"Время на выполнение: {habit.execution_time} сек."
+@shared_task(ignore_result=True)
+def send_telegram_reminder(payload):
+    return send_telegram_reminders_batch([payload])
+
+
+@shared_task(ignore_result=True)
+def send_telegram_reminders_batch(payloads):
+    """Отправить пачку напоминаний через одну keep-alive сессию.
+
+    Повторы ставятся новой задачей с задержкой, недоставленные
+    сохраняются в журнал. Возвращает отчёт по каждому чату.
+    """
+    outcome = deliver_payloads(payloads)
+
+    if outcome['dead_letters']:
+        ReminderDeadLetter.objects.bulk_create(outcome['dead_letters'])
+
+    if outcome['retries']:
+        send_telegram_reminders_batch.apply_async(
+            (outcome['retries'],), countdown=outcome['countdown'],
+            priority=REMINDER_RETRY_PRIORITY
+        )
+
+    results = outcome['results']
+    return {
+        'sent': sum(1 for result in results if result['status'] == SENT),
+        'retried': len(outcome['retries']),
+        'failed': len(outcome['dead_letters']),
+        'dropped': len(outcome['dropped']),
+        'results': results,
+    }
+
+
+# Сколько хранить записи журнала отправок
+REMINDER_DISPATCH_RETENTION = timedelta(days=2)
+
+
+def claim_reminders(due):
+    """Атомарно захватить срабатывания [(habit_id, occurrence), ...].
+
+    Уникальный индекс журнала гарантирует, что каждое срабатывание
+    захватит ровно одна проверка, даже при нескольких экземплярах beat.
+    Возвращает id привычек, захваченных этим вызовом.
+    """
+    token = uuid.uuid4()
+    ReminderDispatch.objects.bulk_create(
+        [
+            ReminderDispatch(
+                habit_id=habit_id, occurrence=occurrence, claim_token=token
+            )
+            for habit_id, occurrence in due
+        ],
+        ignore_conflicts=True,
+        batch_size=1000
+    )
+    return list(
+        ReminderDispatch.objects
+        .filter(claim_token=token)
+        .order_by('habit_id')
+        .values_list('habit_id', flat=True)
+    )
+
+
+@shared_task(ignore_result=True)
+def check_and_send_reminders():
+    """Разбить проверку напоминаний на шарды по id привычки"""
+    now = timezone.now().isoformat()
+    shard_count = settings.REMINDER_SHARD_COUNT
+
+    degraded = backlog_exceeded()
+    if degraded:
+        logger.warning('Reminder backlog over %s: degraded mode',
+                       settings.REMINDER_BACKLOG_THRESHOLD)
+
+    if shard_count <= 1:
+        scan_reminder_shard(now, 0, 1, degraded)
+        return
+
+    group(
+        scan_reminder_shard.s(now, shard, shard_count, degraded)
+        for shard in range(shard_count)
+    ).apply_async()
+
 
-        bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-        if not bot_token:
-            print("TELEGRAM_BOT_TOKEN not set")
+@shared_task(ignore_result=True)
+def scan_reminder_shard(now, shard, shard_count, degraded=False):
+    """Отправить напоминания привычек с reminder_slot % shard_count == shard.
+
+    Слот вычисляется по пользователю, чтобы одновременные привычки одного
+    пользователя попадали в одну проверку и могли объединиться в сводку.
+
+    В режиме перегрузки (degraded) напоминания старше
+    REMINDER_STALE_SECONDS не отправляются, напоминания каждого чата
+    объединяются в одно сообщение, а задания ставятся в очередь вперёд
+    накопившихся.
+    """
+    now = datetime.fromisoformat(now)
+    scanned_at = timezone.now()
+    grace = timedelta(minutes=settings.REMINDER_GRACE_MINUTES)
+    if degraded:
+        grace = min(grace, timedelta(seconds=settings.REMINDER_STALE_SECONDS))
+
+    # Привычки читаются с блокировкой до конца транзакции: изменение
+    # времени привычки (Habit.save) не затирается переносом по старому
+    # расписанию, а пересекающиеся проверки не берут одни и те же строки
+    with transaction.atomic():
+        habits = due_habits(now, shard, shard_count)
+        if not habits:
             return
 
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        payload = {
-            'chat_id': user.telegram_chat_id,
-            'text': message,
-            'parse_mode': 'HTML'
+        unreachable = unreachable_chats(
+            habit.user.telegram_chat_id for habit in habits
+        )
+
+        # Опоздавшие дольше grace-периода (например, после простоя) и
+        # привычки без доступного чата только переносятся на следующее
+        # срабатывание
+        due = {
+            habit.id: (habit.next_fire_at, habit)
+            for habit in habits
+            if habit.user.telegram_chat_id
+            and habit.user.telegram_chat_id not in unreachable
+            and habit.next_fire_at >= now - grace
         }
 
-        response = requests.post(url, json=payload)
-        if response.status_code != 200:
-            print(f"Failed to send message: {response.text}")
+        # next_fire_at отдаётся API, поэтому updated_at (ETag списков)
+        # тоже сдвигается
+        for habit in habits:
+            habit.schedule_next_fire(now)
+            habit.updated_at = now
 
-    except Habit.DoesNotExist:
-        print(f"Habit with id {habit_id} does not exist")
-    except Exception as e:
-        print(f"Error sending reminder: {e}")
+        # Перенос срабатываний, захват в журнале и постановка в очередь
+        # выполняются атомарно: при сбое проверка повторится целиком
+        Habit.objects.bulk_update(habits, ['next_fire_at', 'updated_at'],
+                                  batch_size=1000)
+        if not due:
+            return
+
+        claimed = claim_reminders(
+            (habit_id, occurrence)
+            for habit_id, (occurrence, _) in due.items()
+        )
+        payloads = build_reminder_payloads(
+            [due[habit_id][1] for habit_id in claimed], merge_all=degraded
+        )
+        for payload in payloads:
+            scheduled_at = min(
+                due[habit_id][0] for habit_id in payload['habit_ids']
+            )
+            stamp_payload(payload, scheduled_at, scanned_at)
+        if degraded:
+            payloads.sort(key=lambda payload: payload['scheduled_at'],
+                          reverse=True)
+        dispatch_payloads(payloads, now,
+                          priority=REMINDER_FRESH_PRIORITY if degraded else None)
 
+    if payloads:
+        oldest = min(payload['scheduled_at'] for payload in payloads)
+        logger.info('Shard %d/%d: %d reminders, oldest %.1f s late',
+                    shard, shard_count, len(payloads),
+                    scanned_at.timestamp() - oldest)
+
+
+def due_habits(now, shard, shard_count):
+    """Привычки шарда со срабатыванием не позже now, заблокированные до
+    конца транзакции.
+
+    Строки, уже захваченные другой проверкой, пропускаются (SKIP LOCKED);
+    в SQLite блокировок строк нет.
+    """
+    habits = Habit.objects.filter(next_fire_at__lte=now)
+    if shard_count > 1:
+        # Условие на слоты проходит по индексу (reminder_slot,
+        # next_fire_at): шард читает только свои строки
+        habits = habits.filter(reminder_slot__in=list(
+            range(shard, REMINDER_SLOTS, shard_count)
+        ))
+
+    habits = (
+        habits
+        .select_related('user')
+        .only('id', 'time', 'periodicity', 'day_of_week', 'next_fire_at',
+              'action', 'place', 'execution_time',
+              'user__telegram_chat_id', 'user__timezone',
+              'user__reminder_digest')
+        .order_by('next_fire_at')
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        habits = habits.select_for_update(skip_locked=True, of=('self',))
+    return list(habits)
 
-@shared_task
-def check_and_send_reminders():
-    from django.utils import timezone
 
+def unreachable_chats(chat_ids):
+    """Чаты из chat_ids, отправка в которые невозможна"""
+    return set(
+        ReminderDeadLetter.objects
+        .filter(chat_id__in=set(chat_ids) - {None, ''},
+                chat_unreachable=True)
+        .values_list('chat_id', flat=True)
+    )
+
+
+def spread_offset(habit_id):
+    """Сдвиг отправки привычки (в секундах) внутри REMINDER_SPREAD_SECONDS.
+
+    Зависит только от id привычки, поэтому одно и то же напоминание
+    всегда приходит с одинаковой задержкой, а напоминания круглых минут
+    распределяются по окну равномерно.
+    """
+    window = settings.REMINDER_SPREAD_SECONDS
+    if window <= 0:
+        return 0
+    return zlib.crc32(str(habit_id).encode()) % window
+
+
+def stamp_payload(payload, scheduled_at, scanned_at):
+    """Метки этапов для замера задержки и время отправки напоминания"""
+    payload['scheduled_at'] = scheduled_at.timestamp()
+    payload['scanned_at'] = scanned_at.timestamp()
+    payload['send_at'] = (payload['scheduled_at'] +
+                          spread_offset(payload['habit_id']))
+
+
+def timestamp_to_datetime(value):
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, tz=ZoneInfo('UTC'))
+
+
+def dispatch_payloads(payloads, now, priority=None):
+    """Передать задания на отправку выбранному способу доставки.
+
+    Вызывается внутри транзакции: в очередь в базе задания попадают
+    вместе с ней, в брокер — только после её фиксации. priority
+    переопределяет приоритет задач отправки в брокере.
+    """
+    if settings.REMINDER_DELIVERY == 'outbox':
+        ReminderOutbox.objects.bulk_create(
+            [
+                ReminderOutbox(
+                    habit_id=payload['habit_id'],
+                    chat_id=payload['chat_id'],
+                    text=payload['text'],
+                    available_at=max(
+                        now,
+                        timestamp_to_datetime(payload.get('send_at')) or now
+                    ),
+                    scheduled_at=timestamp_to_datetime(
+                        payload.get('scheduled_at')
+                    ),
+                    scanned_at=timestamp_to_datetime(payload.get('scanned_at'))
+                )
+                for payload in payloads
+            ],
+            batch_size=1000
+        )
+        transaction.on_commit(lambda: record_enqueued(len(payloads)))
+    else:
+        transaction.on_commit(lambda: enqueue_reminders(payloads, priority))
+
+
+def enqueue_reminders(payloads, priority=None):
+    """Поставить задачи отправки пачками, каждую — к её времени send_at"""
+    enqueued_at = timezone.now().timestamp()
+    by_countdown = {}
+    for payload in payloads:
+        payload['enqueued_at'] = enqueued_at
+        countdown = round(payload.get('send_at', enqueued_at) - enqueued_at)
+        by_countdown.setdefault(max(countdown, 0), []).append(payload)
+    record_enqueued(len(payloads), enqueued_at)
+
+    batch_size = settings.REMINDER_BATCH_SIZE
+    for countdown, group_payloads in sorted(by_countdown.items()):
+        options = {}
+        if countdown:
+            options['countdown'] = countdown
+        if priority is not None:
+            options['priority'] = priority
+
+        for start in range(0, len(group_payloads), batch_size):
+            batch = group_payloads[start:start + batch_size]
+            if options:
+                send_telegram_reminders_batch.apply_async((batch,), **options)
+            else:
+                send_telegram_reminders_batch.delay(batch)
+
+
+@shared_task(ignore_result=True)
+def send_morning_summaries():
+    """Утренняя сводка привычек на день для пользователей в режиме сводки.
+
+    Задача запускается каждую минуту; сводка уходит пользователям, у
+    которых местное время попало в окно после DIGEST_SUMMARY_TIME.
+    Журнал сводок не даёт отправить её дважды за день.
+    """
     now = timezone.now()
-    current_time = now.time()
-    current_weekday = now.weekday() + 1
+    summary_time = time_of_day.fromisoformat(settings.DIGEST_SUMMARY_TIME)
+    grace = timedelta(minutes=settings.REMINDER_GRACE_MINUTES)
 
-    habits = Habit.objects.all()
+    digest_users = User.objects.filter(
+        reminder_digest=True, telegram_chat_id__isnull=False
+    ).exclude(telegram_chat_id='')
 
-    for habit in habits:
-        if not habit.user.telegram_chat_id:
+    timezones = digest_users.values_list('timezone', flat=True).distinct()
+    for tz_name in timezones:
+        local_now = now.astimezone(ZoneInfo(tz_name))
+        start = datetime.combine(local_now.date(), summary_time,
+                                 tzinfo=local_now.tzinfo)
+        if not start <= local_now < start + grace:
             continue
 
-        habit_time = habit.time
+        users = list(digest_users.filter(timezone=tz_name).only(
+            'id', 'telegram_chat_id'
+        ))
+        unreachable = unreachable_chats(
+            user.telegram_chat_id for user in users
+        )
+        users = [user for user in users
+                 if user.telegram_chat_id not in unreachable]
+        if not users:
+            continue
 
-        if habit.periodicity == 'daily':
-            time_diff = abs(
-                (current_time.hour * 60 + current_time.minute) -
-                (habit_time.hour * 60 + habit_time.minute)
+        weekday = local_now.isoweekday()
+        with transaction.atomic():
+            claimed = claim_summaries(
+                [user.id for user in users], local_now.date()
             )
-            if time_diff <= 5:
-                send_telegram_reminder.delay(habit.id)
-
-        elif habit.periodicity == 'weekly' and habit.day_of_week:
-            if habit.day_of_week == current_weekday:
-                time_diff = abs(
-                    (current_time.hour * 60 + current_time.minute) -
-                    (habit_time.hour * 60 + habit_time.minute)
-                )
-                if time_diff <= 5:
-                    send_telegram_reminder.delay(habit.id)
+            habits = (
+                Habit.objects
+                .filter(user_id__in=claimed)
+                .filter(Q(periodicity='daily') |
+                        Q(periodicity='weekly', day_of_week=weekday))
+                .select_related('user')
+                .order_by('user_id', 'time', 'id')
+            )
+
+            by_user = {}
+            for habit in habits:
+                by_user.setdefault(habit.user_id, []).append(habit)
+
+            payloads = [
+                build_payload(user_habits, build_summary_message(user_habits))
+                for user_habits in by_user.values()
+            ]
+            for payload in payloads:
+                stamp_payload(payload, start, now)
+            dispatch_payloads(payloads, now)
+
+
+def claim_summaries(user_ids, date):
+    """Атомарно захватить утренние сводки пользователей за дату"""
+    token = uuid.uuid4()
+    MorningSummaryDispatch.objects.bulk_create(
+        [
+            MorningSummaryDispatch(user_id=user_id, date=date,
+                                   claim_token=token)
+            for user_id in user_ids
+        ],
+        ignore_conflicts=True,
+        batch_size=1000
+    )
+    return list(
+        MorningSummaryDispatch.objects
+        .filter(claim_token=token)
+        .values_list('user_id', flat=True)
+    )
+
+
+@shared_task(ignore_result=True)
+def drain_reminder_outbox():
+    """Разбирать очередь напоминаний, пока она не опустеет.
+
+    Задачу можно запускать на нескольких воркерах одновременно.
+    """
+    deadline = time.monotonic() + settings.REMINDER_OUTBOX_DRAIN_SECONDS
+    processed = 0
+    while time.monotonic() < deadline:
+        count = drain_outbox_batch(settings.REMINDER_BATCH_SIZE)
+        if not count:
+            break
+        processed += count
+    return processed
+
+
+@shared_task(ignore_result=True)
+def cleanup_reminder_dispatches():
+    """Удалить устаревшие записи журналов отправок и сводок"""
+    threshold = timezone.now() - REMINDER_DISPATCH_RETENTION
+    deleted, _ = ReminderDispatch.objects.filter(
+        created_at__lt=threshold
+    ).delete()
+    summaries, _ = MorningSummaryDispatch.objects.filter(
+        created_at__lt=threshold
+    ).delete()
+    return deleted + summaries
+
+
+@shared_task(ignore_result=True)
+def cleanup_reminder_outbox():
+    """Удалить обработанные записи очереди напоминаний"""
+    threshold = timezone.now() - REMINDER_DISPATCH_RETENTION
+    deleted, _ = ReminderOutbox.objects.filter(
+        created_at__lt=threshold
+    ).exclude(status=ReminderOutbox.PENDING).delete()
+    return deleted
@@ -0,0 +1,831 @@
+import asyncio
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from telegram.error import Forbidden, NetworkError
+from apps.habits.models import REMINDER_SLOTS, Habit
+from config.celery import app as celery_app
+from . import metrics
+from .async_sender import AsyncReminderSender
+from .models import ReminderDeadLetter, ReminderDispatch, ReminderOutbox
+from .outbox import drain_outbox_batch
+from .tasks import (
+    check_and_send_reminders,
+    cleanup_reminder_outbox,
+    scan_reminder_shard,
+    send_morning_summaries,
+    send_telegram_reminders_batch,
+    spread_offset,
+)
+
+User = get_user_model()
+
+
+class CheckAndSendRemindersTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='telegramuser',
+            password='testpass123',
+            telegram_chat_id='123456'
+        )
+
+    def create_habit(self, habit_time, now, **kwargs):
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            return Habit.objects.create(
+                user=self.user,
+                place='Дома',
+                time=habit_time,
+                action='Читать книгу',
+                execution_time=60,
+                **kwargs
+            )
+
+    def run_scan(self, now):
+        with mock.patch('django.utils.timezone.now', return_value=now), \
+                mock.patch('apps.telegram_bot.tasks.'
+                           'send_telegram_reminders_batch.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            check_and_send_reminders()
+        return {
+            payload['habit_id']
+            for call in delay.call_args_list
+            for payload in call.args[0]
+        }
+
+    def test_daily_habit_fires_and_is_rescheduled(self):
+        created = datetime(2026, 3, 2, 8, 0, tzinfo=dt_timezone.utc)
+        habit = self.create_habit('09:00:00', created)
+        self.create_habit('09:30:00', created)
+
+        self.assertEqual(self.run_scan(created.replace(minute=59)), set())
+
+        now = datetime(2026, 3, 2, 9, 0, 20, tzinfo=dt_timezone.utc)
+        self.assertEqual(self.run_scan(now), {habit.id})
+        habit.refresh_from_db()
+        self.assertEqual(
+            habit.next_fire_at,
+            datetime(2026, 3, 3, 9, 0, tzinfo=dt_timezone.utc)
+        )
+
+    def test_payload_is_self_contained(self):
+        created = datetime(2026, 3, 2, 8, 0, tzinfo=dt_timezone.utc)
+        habit = self.create_habit('09:00:00', created)
+        now = datetime(2026, 3, 2, 9, 0, tzinfo=dt_timezone.utc)
+
+        with mock.patch('django.utils.timezone.now', return_value=now), \
+                mock.patch('apps.telegram_bot.tasks.'
+                           'send_telegram_reminders_batch.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            check_and_send_reminders()
+
+        payload, = delay.call_args.args[0]
+        self.assertEqual(payload['habit_id'], habit.id)
+        self.assertEqual(payload['chat_id'], '123456')
+        self.assertIn('Читать книгу', payload['text'])
+
+    def test_habit_created_just_after_midnight_wrap(self):
+        # Понедельник 00:02: привычка на воскресенье 23:58 ещё успевает
+        now = datetime(2026, 3, 2, 0, 2, tzinfo=dt_timezone.utc)
+        sunday = self.create_habit(
+            '23:58:00', now, periodicity='weekly', day_of_week=7
+        )
+        self.create_habit('23:58:00', now, periodicity='weekly',
+                          day_of_week=1)
+        self.assertEqual(self.run_scan(now), {sunday.id})
+
+    def test_stale_reminders_are_skipped(self):
+        created = datetime(2026, 3, 2, 8, 0, tzinfo=dt_timezone.utc)
+        habit = self.create_habit('09:00:00', created)
+
+        now = datetime(2026, 3, 2, 9, 30, tzinfo=dt_timezone.utc)
+        self.assertEqual(self.run_scan(now), set())
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_fire_at.day, 3)
+
+    def test_unreachable_chats_are_skipped(self):
+        now = datetime(2026, 3, 2, 9, 0, tzinfo=dt_timezone.utc)
+        habit = self.create_habit('09:00:00', now)
+        ReminderDeadLetter.objects.create(
+            chat_id='123456', payload={}, chat_unreachable=True
+        )
+        self.assertEqual(self.run_scan(now), set())
+        habit.refresh_from_db()
+        self.assertGreater(habit.next_fire_at, now)
+
+    def test_users_without_chat_id_are_skipped(self):
+        now = datetime(2026, 3, 2, 9, 0, tzinfo=dt_timezone.utc)
+        self.user.telegram_chat_id = ''
+        self.user.save()
+        self.create_habit('09:00:00', now)
+        self.assertEqual(self.run_scan(now), set())
+
+    def test_occurrence_is_dispatched_once(self):
+        created = datetime(2026, 3, 2, 8, 0, tzinfo=dt_timezone.utc)
+        habit = self.create_habit('09:00:00', created)
+        now = datetime(2026, 3, 2, 9, 0, tzinfo=dt_timezone.utc)
+        self.assertEqual(self.run_scan(now), {habit.id})
+
+        # Пересекающаяся проверка видит старое next_fire_at,
+        # но журнал отправок не даёт отправить повторно
+        Habit.objects.filter(id=habit.id).update(next_fire_at=now)
+        self.assertEqual(self.run_scan(now), set())
+        self.assertEqual(ReminderDispatch.objects.count(), 1)
+
+    def test_shards_partition_due_habits(self):
+        created = datetime(2026, 3, 2, 8, 0, tzinfo=dt_timezone.utc)
+        habits = [self.create_habit('09:00:00', created) for _ in range(7)]
+        now = datetime(2026, 3, 2, 9, 0, tzinfo=dt_timezone.utc)
+
+        with override_settings(REMINDER_SHARD_COUNT=3), \
+                mock.patch('django.utils.timezone.now', return_value=now), \
+                mock.patch('apps.telegram_bot.tasks.group') as group:
+            check_and_send_reminders()
+        signatures = list(group.call_args.args[0])
+        self.assertEqual(len(signatures), 3)
+
+        sent = []
+        with mock.patch('apps.telegram_bot.tasks.'
+                        'send_telegram_reminders_batch.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            for signature in signatures:
+                scan_reminder_shard(*signature.args)
+        for call in delay.call_args_list:
+            sent.extend(payload['habit_id'] for payload in call.args[0])
+        self.assertCountEqual(sent, [habit.id for habit in habits])
+
+    def test_shard_reads_only_its_slots(self):
+        created = datetime(2026, 3, 2, 8, 0, tzinfo=dt_timezone.utc)
+        users = [self.user] + [
+            User.objects.create_user(username=f'sharduser{i}',
+                                     password='testpass123',
+                                     telegram_chat_id=str(1000 + i))
+            for i in range(3)
+        ]
+        habits = [self.create_habit('09:00:00', created)]
+        habits += Habit.objects.bulk_create([
+            Habit(user=user, place='Дома', time='09:00:00', action='Бег',
+                  next_fire_at=habits[0].next_fire_at)
+            for user in users[1:]
+        ])
+        slots = dict(Habit.objects.values_list('user_id', 'reminder_slot'))
+        self.assertEqual(slots, {
+            user.id: user.id % REMINDER_SLOTS for user in users
+        })
+
+        now = datetime(2026, 3, 2, 9, 0, tzinfo=dt_timezone.utc)
+        for shard in range(2):
+            with mock.patch('django.utils.timezone.now', return_value=now), \
+                    mock.patch('apps.telegram_bot.tasks.'
+                               'send_telegram_reminders_batch.delay') as delay, \
+                    CaptureQueriesContext(connection) as queries, \
+                    self.captureOnCommitCallbacks(execute=True):
+                scan_reminder_shard(now.isoformat(), shard, 2)
+            scan_sql, = [query['sql'] for query in queries
+                         if query['sql'].startswith('SELECT')
+                         and '"habits_habit"' in query['sql']]
+            self.assertIn('"reminder_slot" IN', scan_sql)
+            sent = {payload['habit_id'] for call in delay.call_args_list
+                    for payload in call.args[0]}
+            self.assertEqual(sent, {
+                habit.id for habit in habits if habit.user_id % 2 == shard
+            })
+
+    @override_settings(REMINDER_SPREAD_SECONDS=30)
+    def test_peak_minute_is_spread_deterministically(self):
+        created = datetime(2026, 3, 2, 8, 0, tzinfo=dt_timezone.utc)
+        habits = [self.create_habit('09:00:00', created) for _ in range(20)]
+        now = datetime(2026, 3, 2, 9, 0, 10, tzinfo=dt_timezone.utc)
+
+        with mock.patch('django.utils.timezone.now', return_value=now), \
+                mock.patch('apps.telegram_bot.tasks.'
+                           'send_telegram_reminders_batch.apply_async') as send, \
+                mock.patch('apps.telegram_bot.tasks.'
+                           'send_telegram_reminders_batch.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            check_and_send_reminders()
+
+        countdowns = {}
+        for call in send.call_args_list:
+            for payload in call.args[0][0]:
+                countdowns[payload['habit_id']] = call.kwargs['countdown']
+        for call in delay.call_args_list:
+            for payload in call.args[0]:
+                countdowns[payload['habit_id']] = 0
+
+        self.assertEqual(set(countdowns), {habit.id for habit in habits})
+        # Сдвиг отсчитывается от запланированного времени, а не от проверки
+        for habit in habits:
+            offset = spread_offset(habit.id)
+            self.assertLess(offset, 30)
+            self.assertEqual(countdowns[habit.id], max(offset - 10, 0))
+        self.assertGreater(len(set(countdowns.values())), 5)
+
+
+class DigestModeTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='digestuser',
+            password='testpass123',
+            telegram_chat_id='777',
+            timezone='Europe/Moscow',
+            reminder_digest=True
+        )
+        created = datetime(2026, 3, 2, 0, 0, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=created):
+            self.habits = [
+                Habit.objects.create(user=self.user, place='Дома',
+                                     time='09:00:00', action=f'Бег {i}')
+                for i in range(3)
+            ]
+            self.weekly = Habit.objects.create(
+                user=self.user, place='Парк', time='18:00:00',
+                action='Велосипед', periodicity='weekly', day_of_week=2
+            )
+
+    def capture(self, task, now):
+        with mock.patch('django.utils.timezone.now', return_value=now), \
+                mock.patch('apps.telegram_bot.tasks.'
+                           'send_telegram_reminders_batch.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            task()
+        return [payload for call in delay.call_args_list
+                for payload in call.args[0]]
+
+    def test_simultaneous_reminders_are_merged(self):
+        # 09:00 по Москве
+        now = datetime(2026, 3, 2, 6, 0, tzinfo=dt_timezone.utc)
+        payload, = self.capture(check_and_send_reminders, now)
+        self.assertCountEqual(payload['habit_ids'],
+                              [habit.id for habit in self.habits])
+        self.assertIn('Бег 0', payload['text'])
+        self.assertIn('Бег 2', payload['text'])
+
+    def test_morning_summary_is_sent_once_a_day(self):
+        # Понедельник, 07:01 по Москве: еженедельная привычка на вторник
+        # в сводку не попадает
+        now = datetime(2026, 3, 2, 4, 1, tzinfo=dt_timezone.utc)
+        payload, = self.capture(send_morning_summaries, now)
+        self.assertEqual(payload['chat_id'], '777')
+        self.assertEqual(len(payload['habit_ids']), 3)
+        self.assertNotIn('Велосипед', payload['text'])
+
+        later = datetime(2026, 3, 2, 4, 3, tzinfo=dt_timezone.utc)
+        self.assertEqual(self.capture(send_morning_summaries, later), [])
+
+        tuesday = datetime(2026, 3, 3, 4, 0, tzinfo=dt_timezone.utc)
+        payload, = self.capture(send_morning_summaries, tuesday)
+        self.assertIn('Велосипед', payload['text'])
+
+
+class NextFireAtTest(TestCase):
+    def create_habit(self, tz_name, now, **kwargs):
+        user = User.objects.create_user(
+            username=f'user_{tz_name}', password='testpass123',
+            timezone=tz_name
+        )
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            return Habit.objects.create(
+                user=user, place='Дома', time='09:00:00', action='Бег',
+                **kwargs
+            )
+
+    def test_user_timezone_is_applied(self):
+        now = datetime(2026, 3, 2, 0, 0, tzinfo=dt_timezone.utc)
+        habit = self.create_habit('Europe/Moscow', now)
+        self.assertEqual(
+            habit.next_fire_at,
+            datetime(2026, 3, 2, 6, 0, tzinfo=dt_timezone.utc)
+        )
+
+    def test_daylight_saving_transition(self):
+        # В Нью-Йорке летнее время начинается 8 марта 2026
+        now = datetime(2026, 3, 7, 15, 0, tzinfo=dt_timezone.utc)
+        habit = self.create_habit('America/New_York', now)
+        self.assertEqual(
+            habit.next_fire_at,
+            datetime(2026, 3, 8, 13, 0, tzinfo=dt_timezone.utc)
+        )
+
+    def test_timezone_change_reschedules_habits(self):
+        now = datetime(2026, 3, 2, 0, 0, tzinfo=dt_timezone.utc)
+        habit = self.create_habit('UTC', now)
+        user = habit.user
+        user.timezone = 'Asia/Tokyo'
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            user.save()
+        habit.refresh_from_db()
+        # 09:00 по Токио наступает сейчас и ещё в пределах grace-периода
+        self.assertEqual(
+            habit.next_fire_at,
+            datetime(2026, 3, 2, 0, 0, tzinfo=dt_timezone.utc)
+        )
+
+    def test_save_without_timezone_change_keeps_schedule(self):
+        now = datetime(2026, 3, 2, 0, 0, tzinfo=dt_timezone.utc)
+        habit = self.create_habit('Asia/Tokyo', now)
+        later = datetime(2026, 3, 2, 12, 0, tzinfo=dt_timezone.utc)
+        user = User.objects.get(pk=habit.user_id)
+        user.first_name = 'Иван'
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            user.save()
+            user.timezone = 'Asia/Tokyo'
+            user.save(update_fields=['timezone'])
+
+        saved = Habit.objects.get(pk=habit.pk)
+        self.assertEqual(saved.updated_at, habit.updated_at)
+        self.assertEqual(saved.next_fire_at, habit.next_fire_at)
+
+
+def telegram_response(status_code, description='', retry_after=None):
+    body = {'ok': status_code == 200, 'description': description}
+    if retry_after:
+        body['parameters'] = {'retry_after': retry_after}
+    return mock.Mock(status_code=status_code, text=description,
+                     json=mock.Mock(return_value=body))
+
+
+@override_settings(TELEGRAM_BOT_TOKEN='test-token')
+class SendTelegramRemindersBatchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.payloads = [
+            {'habit_id': i, 'chat_id': str(1000 + i), 'text': 'Бег'}
+            for i in range(3)
+        ]
+
+    def send(self, responses, payloads=None):
+        with mock.patch('apps.telegram_bot.sender.get_session') as session, \
+                mock.patch('apps.telegram_bot.tasks.'
+                           'send_telegram_reminders_batch.apply_async') as retry:
+            session.return_value.post.side_effect = responses
+            report = send_telegram_reminders_batch(payloads or self.payloads)
+        return report, session.return_value.post, retry
+
+    def test_batch_reuses_session_and_reports_each_chat(self):
+        ok = telegram_response(200)
+        with self.assertNumQueries(0):
+            report, post, retry = self.send([ok, ok, ok])
+
+        self.assertEqual(post.call_count, 3)
+        self.assertEqual(report['sent'], 3)
+        self.assertEqual({r['chat_id'] for r in report['results']},
+                         {'1000', '1001', '1002'})
+        retry.assert_not_called()
+
+    def test_blocked_chat_is_dead_lettered(self):
+        blocked = telegram_response(
+            403, 'Forbidden: bot was blocked by the user'
+        )
+        ok = telegram_response(200)
+        report, post, retry = self.send([ok, blocked, ok])
+
+        self.assertEqual(report['sent'], 2)
+        self.assertEqual(report['failed'], 1)
+        letter = ReminderDeadLetter.objects.get()
+        self.assertEqual(letter.chat_id, '1001')
+        self.assertTrue(letter.chat_unreachable)
+        retry.assert_not_called()
+
+    def test_rate_limit_honours_retry_after(self):
+        ok = telegram_response(200)
+        limited = telegram_response(429, 'Too Many Requests', retry_after=42)
+        report, post, retry = self.send([ok, limited])
+
+        self.assertEqual(post.call_count, 2)
+        retried, = retry.call_args.args[0]
+        self.assertEqual([p['habit_id'] for p in retried], [1, 2])
+        self.assertEqual(retried[0]['attempt'], 1)
+        self.assertNotIn('attempt', retried[1])
+        self.assertGreaterEqual(retry.call_args.kwargs['countdown'], 42)
+
+    def test_retries_are_exhausted_into_dead_letters(self):
+        payload = {**self.payloads[0], 'attempt': 5}
+        error = telegram_response(502, 'Bad Gateway')
+        report, post, retry = self.send([error], [payload])
+
+        retry.assert_not_called()
+        letter = ReminderDeadLetter.objects.get()
+        self.assertEqual(letter.attempts, 6)
+        self.assertFalse(letter.chat_unreachable)
+
+    @override_settings(TELEGRAM_BREAKER_MIN_CALLS=2)
+    def test_breaker_pauses_sending(self):
+        error = telegram_response(502, 'Bad Gateway')
+        report, post, retry = self.send([error, error, error])
+
+        # После двух ошибок подряд третье сообщение не отправляется
+        self.assertEqual(post.call_count, 2)
+        retried, = retry.call_args.args[0]
+        self.assertEqual(len(retried), 3)
+        self.assertGreaterEqual(retry.call_args.kwargs['countdown'], 30)
+
+
+@override_settings(TELEGRAM_BOT_TOKEN='test-token',
+                   REMINDER_LAG_SLO_SECONDS=60)
+class ReminderLagMetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='metricsuser',
+            password='testpass123',
+            telegram_chat_id='777'
+        )
+        self.now = datetime(2026, 3, 2, 9, 1, 30, tzinfo=dt_timezone.utc)
+
+    def test_scan_stamps_payload_stages(self):
+        created = datetime(2026, 3, 2, 8, 0, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=created):
+            Habit.objects.create(user=self.user, place='Дома',
+                                 time='09:00:00', action='Бег')
+
+        with mock.patch('django.utils.timezone.now', return_value=self.now), \
+                mock.patch('apps.telegram_bot.tasks.'
+                           'send_telegram_reminders_batch.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            check_and_send_reminders()
+
+        payload, = delay.call_args.args[0]
+        self.assertEqual(payload['scheduled_at'], datetime(
+            2026, 3, 2, 9, 0, tzinfo=dt_timezone.utc
+        ).timestamp())
+        self.assertEqual(payload['scanned_at'], self.now.timestamp())
+        self.assertEqual(payload['enqueued_at'], self.now.timestamp())
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            self.assertEqual(metrics.snapshot()['backlog'], 1)
+
+    def test_delivery_fills_histograms_and_backlog(self):
+        now = self.now.timestamp()
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            metrics.record_enqueued(1, now - 70)
+            metrics.record_enqueued(1, now - 3)
+        payloads = [
+            {'habit_id': 1, 'chat_id': '777', 'text': 'Бег',
+             'scheduled_at': now - 90, 'scanned_at': now - 80,
+             'enqueued_at': now - 70},
+            {'habit_id': 2, 'chat_id': '778', 'text': 'Сон',
+             'scheduled_at': now - 5, 'scanned_at': now - 4,
+             'enqueued_at': now - 3},
+        ]
+        with mock.patch('django.utils.timezone.now', return_value=self.now), \
+                mock.patch('apps.telegram_bot.sender.get_session') as session:
+            session.return_value.post.return_value = telegram_response(200)
+            send_telegram_reminders_batch(payloads)
+            data = metrics.snapshot()
+
+        self.assertEqual(data['backlog'], 0)
+        self.assertEqual(data['counters']['reminders_sent'], 2)
+        self.assertEqual(data['counters']['reminders_late'], 1)
+        total = data['histograms']['reminder_total_lag']
+        self.assertEqual(total['count'], 2)
+        self.assertEqual(total['buckets'][5], 1)
+        self.assertEqual(total['buckets'][60], 1)
+        self.assertEqual(total['buckets'][120], 2)
+        self.assertEqual(metrics.histogram_quantile(total, 0.99), 120)
+
+        out = StringIO()
+        call_command('reminder_metrics', output='prometheus', stdout=out)
+        self.assertIn('reminder_total_lag_seconds_bucket{le="120"} 2',
+                      out.getvalue())
+        self.assertIn('reminder_backlog 0', out.getvalue())
+
+
+@override_settings(TELEGRAM_BOT_TOKEN='test-token',
+                   REMINDER_STALE_SECONDS=120)
+class BacklogDegradationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='backloguser',
+            password='testpass123',
+            telegram_chat_id='999'
+        )
+        self.now = datetime(2026, 3, 2, 9, 3, 10, tzinfo=dt_timezone.utc)
+
+    def create_habit(self, habit_time, action):
+        created = datetime(2026, 3, 2, 8, 0, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=created):
+            return Habit.objects.create(user=self.user, place='Дома',
+                                        time=habit_time, action=action)
+
+    def test_scan_merges_chats_and_skips_stale_reminders(self):
+        self.create_habit('09:00:00', 'Зарядка')
+        current = [self.create_habit('09:03:00', 'Бег'),
+                   self.create_habit('09:03:00', 'Душ')]
+
+        with mock.patch('django.utils.timezone.now', return_value=self.now), \
+                mock.patch('apps.telegram_bot.tasks.backlog_exceeded',
+                           return_value=True), \
+                mock.patch('apps.telegram_bot.tasks.'
+                           'send_telegram_reminders_batch.apply_async') as send, \
+                self.captureOnCommitCallbacks(execute=True):
+            check_and_send_reminders()
+
+        (payloads,), = [call.args[0] for call in send.call_args_list]
+        self.assertEqual(send.call_args.kwargs['priority'], 2)
+        payload, = payloads
+        self.assertEqual(sorted(payload['habit_ids']),
+                         sorted(habit.id for habit in current))
+        self.assertNotIn('Зарядка', payload['text'])
+
+    def test_sender_drops_stale_and_sends_current_first(self):
+        now = self.now.timestamp()
+        payloads = [
+            {'habit_id': 1, 'chat_id': '1', 'text': 'old',
+             'scheduled_at': now - 600},
+            {'habit_id': 2, 'chat_id': '2', 'text': 'recent',
+             'scheduled_at': now - 60},
+            {'habit_id': 3, 'chat_id': '3', 'text': 'current',
+             'scheduled_at': now - 5},
+        ]
+        with mock.patch('django.utils.timezone.now', return_value=self.now), \
+                mock.patch('apps.telegram_bot.delivery.backlog_exceeded',
+                           return_value=True), \
+                mock.patch('apps.telegram_bot.sender.get_session') as session:
+            session.return_value.post.return_value = telegram_response(200)
+            report = send_telegram_reminders_batch(payloads)
+
+        self.assertEqual(report['sent'], 2)
+        self.assertEqual(report['dropped'], 1)
+        chats = [call.kwargs['json']['chat_id']
+                 for call in session.return_value.post.call_args_list]
+        self.assertEqual(chats, ['3', '2'])
+        self.assertEqual(metrics.snapshot()['counters']['reminders_dropped'],
+                         1)
+
+    def enqueue_at(self, moment, count):
+        """Поставить count заданий в момент moment, вернуть их"""
+        enqueued_at = moment.timestamp()
+        with mock.patch('django.utils.timezone.now', return_value=moment):
+            metrics.record_enqueued(count, enqueued_at)
+        return [
+            {'habit_id': i, 'chat_id': str(i), 'text': 'Бег',
+             'enqueued_at': enqueued_at}
+            for i in range(count)
+        ]
+
+    def backlog_exceeded_at(self, moment):
+        with mock.patch('django.utils.timezone.now', return_value=moment):
+            return metrics.backlog_exceeded()
+
+    def deliver_at(self, moment, payloads):
+        with mock.patch('django.utils.timezone.now', return_value=moment), \
+                mock.patch('apps.telegram_bot.sender.get_session') as session:
+            session.return_value.post.return_value = telegram_response(200)
+            send_telegram_reminders_batch(payloads)
+
+    @override_settings(REMINDER_BACKLOG_THRESHOLD=2,
+                       REMINDER_BACKLOG_WINDOW_SECONDS=600)
+    def test_degraded_mode_ends_when_queue_drains(self):
+        payloads = self.enqueue_at(self.now, 3)
+        self.assertTrue(self.backlog_exceeded_at(self.now))
+
+        self.deliver_at(self.now, payloads)
+        self.assertFalse(self.backlog_exceeded_at(self.now))
+
+        # Потерянные задания не держат режим перегрузки дольше окна
+        self.enqueue_at(self.now, 3)
+        self.assertTrue(self.backlog_exceeded_at(self.now))
+        later = self.now + timedelta(seconds=600)
+        self.assertFalse(self.backlog_exceeded_at(later))
+
+    @override_settings(REMINDER_BACKLOG_THRESHOLD=2,
+                       REMINDER_BACKLOG_WINDOW_SECONDS=600)
+    def test_degraded_mode_holds_while_recovering_from_outage(self):
+        # Отправка стоит дольше окна: задания начала простоя выпадают из
+        # оценки, а поставленные позже остаются в ней, пока не отправлены
+        old = self.enqueue_at(self.now, 3)
+        recent_at = self.now + timedelta(minutes=9)
+        recent = self.enqueue_at(recent_at, 3)
+
+        recovery = self.now + timedelta(minutes=11)
+        self.assertTrue(self.backlog_exceeded_at(recovery))
+        self.deliver_at(recovery, old)
+        self.assertTrue(self.backlog_exceeded_at(recovery))
+
+        self.deliver_at(recovery, recent)
+        self.assertFalse(self.backlog_exceeded_at(recovery))
+
+
+class CeleryRoutingTest(TestCase):
+    def route(self, task):
+        options = celery_app.amqp.router.route({}, task.name)
+        return options['queue'].name, options['priority']
+
+    def test_scan_send_and_maintenance_use_separate_queues(self):
+        self.assertEqual(self.route(check_and_send_reminders),
+                         ('reminders_scan', 0))
+        self.assertEqual(self.route(scan_reminder_shard),
+                         ('reminders_scan', 0))
+        self.assertEqual(self.route(send_telegram_reminders_batch),
+                         ('reminders_send', 3))
+        self.assertEqual(self.route(cleanup_reminder_outbox),
+                         ('maintenance', 9))
+
+    def test_reminder_tasks_do_not_store_results(self):
+        for task in (check_and_send_reminders, scan_reminder_shard,
+                     send_telegram_reminders_batch, cleanup_reminder_outbox):
+            self.assertTrue(task.ignore_result, task.name)
+
+
+class BenchmarkRemindersCommandTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_benchmark_reports_throughput(self):
+        out = StringIO()
+        call_command('benchmark_reminders', habits=20, users=5,
+                     latency_ms=0, rate_limit_every=7, retry_after=0,
+                     workers=2, stdout=out)
+        output = out.getvalue()
+        self.assertIn('Отправлено: 20', output)
+        self.assertIn('из них 429', output)
+        self.assertFalse(User.objects.filter(
+            username__startswith='bench_'
+        ).exists())
+        # Метрики прогона пишутся отдельно и удаляются после него
+        self.assertEqual(metrics.snapshot()['counters']['reminders_sent'], 0)
+
+    def test_refuses_database_with_due_reminders(self):
+        user = User.objects.create_user(username='liveuser',
+                                        password='testpass123',
+                                        telegram_chat_id='42')
+        habit = Habit.objects.create(user=user, place='Дома',
+                                     time='09:00:00', action='Бег')
+        Habit.objects.filter(pk=habit.pk).update(
+            next_fire_at=timezone.now() - timedelta(minutes=1)
+        )
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_reminders', habits=5, users=1,
+                         latency_ms=0, stdout=StringIO())
+        self.assertFalse(User.objects.filter(
+            username__startswith='bench_'
+        ).exists())
+        self.assertFalse(ReminderDispatch.objects.exists())
+
+
+@override_settings(TELEGRAM_BOT_TOKEN='test-token',
+                   REMINDER_DELIVERY='outbox')
+class ReminderOutboxTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='outboxuser',
+            password='testpass123',
+            telegram_chat_id='555'
+        )
+        self.created = datetime(2026, 3, 2, 8, 0, tzinfo=dt_timezone.utc)
+        self.now = datetime(2026, 3, 2, 9, 0, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now',
+                        return_value=self.created):
+            self.habits = [
+                Habit.objects.create(user=self.user, place='Дома',
+                                     time='09:00:00', action=f'Бег {i}')
+                for i in range(3)
+            ]
+
+    def drain(self, responses):
+        with mock.patch('django.utils.timezone.now', return_value=self.now), \
+                mock.patch('apps.telegram_bot.sender.get_session') as session:
+            session.return_value.post.side_effect = responses
+            return drain_outbox_batch(10)
+
+    def test_scan_fills_outbox_instead_of_broker(self):
+        with mock.patch('django.utils.timezone.now', return_value=self.now), \
+                mock.patch('apps.telegram_bot.tasks.'
+                           'send_telegram_reminders_batch.delay') as delay:
+            check_and_send_reminders()
+        delay.assert_not_called()
+        self.assertEqual(
+            ReminderOutbox.objects.filter(
+                status=ReminderOutbox.PENDING
+            ).count(),
+            3
+        )
+
+    def test_drain_marks_rows_sent_retried_and_failed(self):
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            check_and_send_reminders()
+
+        processed = self.drain([
+            telegram_response(200),
+            telegram_response(502, 'Bad Gateway'),
+            telegram_response(400, 'Bad Request: chat not found'),
+        ])
+        self.assertEqual(processed, 3)
+
+        statuses = dict(
+            ReminderOutbox.objects.values_list('habit_id', 'status')
+        )
+        self.assertEqual(statuses, {
+            self.habits[0].id: ReminderOutbox.SENT,
+            self.habits[1].id: ReminderOutbox.PENDING,
+            self.habits[2].id: ReminderOutbox.FAILED,
+        })
+        retried = ReminderOutbox.objects.get(habit=self.habits[1])
+        self.assertEqual(retried.attempts, 1)
+        self.assertGreater(retried.available_at, self.now)
+
+    def test_drain_leases_rows_before_sending(self):
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            check_and_send_reminders()
+
+        leased = []
+
+        def post(*args, **kwargs):
+            leased.append(ReminderOutbox.objects.filter(
+                available_at__lte=self.now
+            ).count())
+            return telegram_response(200)
+
+        self.assertEqual(self.drain(post), 3)
+
+        # Во время отправки записи уже отложены арендой, а не заблокированы
+        # открытой транзакцией
+        self.assertEqual(leased, [0, 0, 0])
+        self.assertFalse(ReminderOutbox.objects.exclude(
+            status=ReminderOutbox.SENT
+        ).exists())
+
+        # Отложенная запись ещё не готова к отправке
+        self.assertEqual(self.drain([]), 0)
+
+    def test_async_sender_settles_leased_rows(self):
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            check_and_send_reminders()
+
+        bot = mock.Mock()
+        bot.send_message = mock.AsyncMock(side_effect=[
+            None,
+            NetworkError('Bad Gateway'),
+            Forbidden('Forbidden: bot was blocked by the user'),
+        ])
+        sender = AsyncReminderSender([bot], concurrency=1, batch_size=10,
+                                     lease=60)
+        processed = async_to_sync(sender.run)(once=True)
+        self.assertEqual(processed, 3)
+
+        statuses = dict(
+            ReminderOutbox.objects.values_list('habit_id', 'status')
+        )
+        self.assertEqual(statuses, {
+            self.habits[0].id: ReminderOutbox.SENT,
+            self.habits[1].id: ReminderOutbox.PENDING,
+            self.habits[2].id: ReminderOutbox.FAILED,
+        })
+        self.assertEqual(
+            ReminderOutbox.objects.get(habit=self.habits[1]).attempts, 1
+        )
+        self.assertTrue(ReminderDeadLetter.objects.get().chat_unreachable)
+
+    @override_settings(TELEGRAM_BREAKER_MIN_CALLS=2)
+    def test_async_sender_breaker_syncs_once_per_batch(self):
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            check_and_send_reminders()
+
+        bot = mock.Mock()
+        bot.send_message = mock.AsyncMock(
+            side_effect=NetworkError('Bad Gateway')
+        )
+        sender = AsyncReminderSender([bot], concurrency=1, batch_size=10,
+                                     lease=60)
+        with mock.patch.object(sender.breaker, 'record_many',
+                               wraps=sender.breaker.record_many) as flush:
+            async_to_sync(sender.run)(once=True)
+
+        # Третье сообщение отложено по счётчикам пачки, в кеш они
+        # записываются одним вызовом
+        self.assertEqual(bot.send_message.call_count, 2)
+        flush.assert_called_once_with(2, 2)
+        self.assertTrue(sender.breaker.is_open())
+
+    def test_async_sender_keeps_cache_off_event_loop(self):
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            check_and_send_reminders()
+
+        class LoopGuardCache:
+            def __getattr__(self, name):
+                def call(*args, **kwargs):
+                    try:
+                        asyncio.get_running_loop()
+                    except RuntimeError:
+                        return getattr(cache, name)(*args, **kwargs)
+                    raise AssertionError(f'cache.{name} in the event loop')
+                return call
+
+        bot = mock.Mock()
+        bot.send_message = mock.AsyncMock(return_value=None)
+        sender = AsyncReminderSender([bot], concurrency=2, batch_size=10,
+                                     lease=60)
+        with mock.patch('apps.telegram_bot.metrics.cache', LoopGuardCache()), \
+                mock.patch('apps.telegram_bot.sender.cache', LoopGuardCache()):
+            self.assertEqual(async_to_sync(sender.run)(once=True), 3)
+        self.assertEqual(metrics.snapshot()['counters']['reminders_sent'], 3)
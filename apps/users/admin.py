@@ -5,7 +5,9 @@ from .models import User
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
-    list_display = ('username', 'email', 'telegram_chat_id', 'is_staff')
+    list_display = ('username', 'email', 'telegram_chat_id', 'timezone',
+                    'is_staff')
     fieldsets = UserAdmin.fieldsets + (
-        ('Telegram', {'fields': ('telegram_chat_id',)}),
+        ('Telegram', {'fields': ('telegram_chat_id', 'timezone',
+                                 'reminder_digest')}),
     )
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:09
+
+import apps.users.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='timezone',
+            field=models.CharField(default='UTC', help_text='Например: Europe/Moscow', max_length=64, validators=[apps.users.models.validate_timezone], verbose_name='Часовой пояс'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_timezone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='reminder_digest',
+            field=models.BooleanField(default=False, help_text='Объединять одновременные напоминания в одно сообщение и присылать утреннюю сводку привычек на день', verbose_name='Режим сводки'),
+        ),
+    ]
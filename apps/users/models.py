@@ -1,7 +1,16 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.db import models
 
 
+def validate_timezone(value):
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(f'Неизвестный часовой пояс: {value}')
+
+
 class User(AbstractUser):
     telegram_chat_id = models.CharField(
         max_length=100,
@@ -9,6 +18,23 @@ class User(AbstractUser):
         null=True,
         verbose_name='Telegram Chat ID'
     )
+    timezone = models.CharField(
+        max_length=64,
+        default='UTC',
+        validators=[validate_timezone],
+        verbose_name='Часовой пояс',
+        help_text='Например: Europe/Moscow'
+    )
+    reminder_digest = models.BooleanField(
+        default=False,
+        verbose_name='Режим сводки',
+        help_text='Объединять одновременные напоминания в одно сообщение '
+                  'и присылать утреннюю сводку привычек на день'
+    )
+
+    @property
+    def tzinfo(self):
+        return ZoneInfo(self.timezone)
 
     class Meta:
         verbose_name = 'Пользователь'
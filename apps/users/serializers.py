@@ -10,13 +10,16 @@ class UserSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
-        fields = ('id', 'username', 'email', 'password', 'telegram_chat_id')
+        fields = ('id', 'username', 'email', 'password', 'telegram_chat_id',
+                  'timezone', 'reminder_digest')
 
     def create(self, validated_data):
         user = User.objects.create_user(
             username=validated_data['username'],
             email=validated_data.get('email', ''),
-            password=validated_data['password']
+            password=validated_data['password'],
+            timezone=validated_data.get('timezone', 'UTC'),
+            reminder_digest=validated_data.get('reminder_digest', False)
         )
         return user
 
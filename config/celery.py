@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from kombu import Queue
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
@@ -12,6 +13,50 @@ app = Celery('config')
 #   should have a `CELERY_` prefix.
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
+# Отдельные очереди, чтобы ежеминутная проверка не ждала за тысячами
+# отправок, а отправка — за обслуживанием базы. Воркер без -Q слушает
+# все очереди.
+app.conf.task_default_queue = 'default'
+app.conf.task_queues = (
+    Queue('default'),
+    Queue('reminders_scan'),
+    Queue('reminders_send'),
+    Queue('maintenance'),
+)
+
+# В Redis приоритет 0 — самый высокий; сообщения с разными приоритетами
+# лежат в отдельных списках одной очереди
+app.conf.broker_transport_options = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': list(range(10)),
+    'sep': ':',
+}
+
+REMINDER_TASKS = 'apps.telegram_bot.tasks'
+app.conf.task_routes = {
+    f'{REMINDER_TASKS}.check_and_send_reminders': {
+        'queue': 'reminders_scan', 'priority': 0,
+    },
+    f'{REMINDER_TASKS}.scan_reminder_shard': {
+        'queue': 'reminders_scan', 'priority': 0,
+    },
+    f'{REMINDER_TASKS}.send_morning_summaries': {
+        'queue': 'reminders_scan', 'priority': 1,
+    },
+    f'{REMINDER_TASKS}.send_telegram_reminder': {
+        'queue': 'reminders_send', 'priority': 3,
+    },
+    f'{REMINDER_TASKS}.send_telegram_reminders_batch': {
+        'queue': 'reminders_send', 'priority': 3,
+    },
+    f'{REMINDER_TASKS}.drain_reminder_outbox': {
+        'queue': 'reminders_send', 'priority': 3,
+    },
+    f'{REMINDER_TASKS}.cleanup_*': {
+        'queue': 'maintenance', 'priority': 9,
+    },
+}
+
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
@@ -104,6 +104,27 @@ DATABASES['default']['OPTIONS'] = {
     'options': '-c client_encoding=UTF8'
 }
 
+# Cache: общий Redis в docker-compose, локальная память для разработки
+CACHE_URL = os.getenv('CACHE_URL')
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Сколько (в секундах) хранить страницы публичной ленты. Изменения
+# публичных привычек сбрасывают кеш сразу, срок лишь ограничивает память
+PUBLIC_FEED_CACHE_TIMEOUT = 300
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -173,8 +194,77 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Задачи напоминаний результатов не сохраняют (ignore_result=True),
+# результаты остальных задач хранятся не дольше часа
+CELERY_RESULT_EXPIRES = 3600
+
+# Воркер берёт из брокера не больше CELERY_WORKER_PREFETCH_MULTIPLIER
+# задач на процесс: короткие отправки не застревают за занятым процессом
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(
+    os.getenv('CELERY_WORKER_PREFETCH_MULTIPLIER', '1')
+)
+
 # Telegram settings
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+TELEGRAM_REQUEST_TIMEOUT = 10  # секунд на один запрос к Bot API
+
+# Повторы временных ошибок Bot API: 2, 4, 8... секунд, но не больше 5 минут
+TELEGRAM_MAX_RETRIES = 5
+TELEGRAM_RETRY_BACKOFF = 2
+TELEGRAM_RETRY_BACKOFF_MAX = 300
+
+# Размыкатель: пауза в отправке, если за минуту больше половины
+# запросов (из не менее чем 20) завершились временной ошибкой
+TELEGRAM_BREAKER_ERROR_RATE = 0.5
+TELEGRAM_BREAKER_MIN_CALLS = 20
+TELEGRAM_BREAKER_WINDOW = 60
+TELEGRAM_BREAKER_COOLDOWN = 30
+
+# Насколько (в минутах) напоминание может опоздать и всё ещё быть отправлено
+REMINDER_GRACE_MINUTES = 5
+
+# На сколько параллельных задач делится проверка напоминаний; шарды
+# делят между собой слоты привычек (habits.models.REMINDER_SLOTS)
+REMINDER_SHARD_COUNT = int(os.getenv('REMINDER_SHARD_COUNT', '1'))
+
+# Местное время утренней сводки для пользователей в режиме сводки
+DIGEST_SUMMARY_TIME = os.getenv('DIGEST_SUMMARY_TIME', '07:00')
+
+# Способ доставки напоминаний: 'celery' — задачи в брокере,
+# 'outbox' — очередь в базе, которую разбирают отправители
+REMINDER_DELIVERY = os.getenv('REMINDER_DELIVERY', 'celery')
+REMINDER_OUTBOX_DRAIN_SECONDS = 50
+# На сколько секунд отправитель забирает пачку очереди; если он упадёт,
+# записи снова станут доступны по истечении аренды
+REMINDER_OUTBOX_LEASE_SECONDS = int(
+    os.getenv('REMINDER_OUTBOX_LEASE_SECONDS', '300')
+)
+
+# Сколько напоминаний отправляет одна задача send_telegram_reminders_batch
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', '100'))
+
+# Окно (в секундах), по которому равномерно распределяются напоминания
+# одной минуты: каждая привычка получает постоянный сдвиг внутри окна.
+# 0 — отправлять сразу
+REMINDER_SPREAD_SECONDS = int(os.getenv('REMINDER_SPREAD_SECONDS', '0'))
+
+# Целевая задержка доставки напоминания (в секундах) от запланированного
+# времени; опоздавшие считаются в метрике reminders_late
+REMINDER_LAG_SLO_SECONDS = int(os.getenv('REMINDER_LAG_SLO_SECONDS', '60'))
+
+# Режим перегрузки: когда невыполненных напоминаний больше порога,
+# проверка объединяет напоминания в одно сообщение на чат и ставит свежие
+# вперёд, а напоминания старше REMINDER_STALE_SECONDS отбрасываются
+REMINDER_BACKLOG_THRESHOLD = int(
+    os.getenv('REMINDER_BACKLOG_THRESHOLD', '5000')
+)
+REMINDER_STALE_SECONDS = int(os.getenv('REMINDER_STALE_SECONDS', '120'))
+# За какое время (в секундах) учитываются поставленные в очередь
+# напоминания при оценке очереди; должно превышать обычное ожидание в ней
+REMINDER_BACKLOG_WINDOW_SECONDS = int(
+    os.getenv('REMINDER_BACKLOG_WINDOW_SECONDS', '900')
+)
 
 # Celery Beat settings
 CELERY_BEAT_SCHEDULE = {
@@ -182,4 +272,22 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'apps.telegram_bot.tasks.check_and_send_reminders',
         'schedule': 60.0,  # Каждые 60 секунд
     },
+    'send-morning-summaries-every-minute': {
+        'task': 'apps.telegram_bot.tasks.send_morning_summaries',
+        'schedule': 60.0,
+    },
+    'cleanup-reminder-dispatches-daily': {
+        'task': 'apps.telegram_bot.tasks.cleanup_reminder_dispatches',
+        'schedule': 24 * 60 * 60.0,  # Раз в сутки
+    },
+    'cleanup-reminder-outbox-daily': {
+        'task': 'apps.telegram_bot.tasks.cleanup_reminder_outbox',
+        'schedule': 24 * 60 * 60.0,
+    },
 }
+
+if REMINDER_DELIVERY == 'outbox':
+    CELERY_BEAT_SCHEDULE['drain-reminder-outbox'] = {
+        'task': 'apps.telegram_bot.tasks.drain_reminder_outbox',
+        'schedule': 10.0,
+    }